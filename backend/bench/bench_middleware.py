@@ -0,0 +1,133 @@
+"""
+Per-request and per-chunk overhead of the request-id middleware.
+
+Compares the previous ``@app.middleware("http")`` implementation
+(BaseHTTPMiddleware) with ``core.middleware.RequestContextMiddleware`` on a
+JSON route and an SSE route, calling the ASGI app directly so only the
+middleware stack is measured.
+
+    cd backend && python -m bench.bench_middleware --requests 2000 --chunks 500
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from core.middleware import RequestContextMiddleware
+
+
+def build_app(kind: str, chunks: int) -> FastAPI:
+    app = FastAPI()
+
+    if kind == "base":
+
+        @app.middleware("http")
+        async def add_request_id(request: Request, call_next):
+            request_id = str(uuid.uuid4())
+            request.state.request_id = request_id
+            response = await call_next(request)
+            response.headers["X-Request-Id"] = request_id
+            return response
+
+    else:
+        app.add_middleware(RequestContextMiddleware)
+
+    @app.get("/json")
+    def json_route():
+        return {"status": "ok"}
+
+    @app.get("/sse")
+    async def sse_route():
+        async def stream():
+            for i in range(chunks):
+                yield f"data: {i}\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+async def call(app: FastAPI, path: str) -> int:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("bench", 80),
+    }
+    messages = 0
+    received = False
+    disconnected = asyncio.Event()
+
+    async def receive():
+        nonlocal received
+        if received:
+            # Client stays connected until the response is complete
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+        received = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal messages
+        messages += 1
+
+    await app(scope, receive, send)
+    return messages
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run(kind: str, path: str, requests: int, chunks: int) -> dict[str, float]:
+    app = build_app(kind, chunks)
+    for _ in range(50):
+        await call(app, path)
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        await call(app, path)
+        samples.append(time.perf_counter() - started)
+    per_chunk = statistics.mean(samples) / chunks if path == "/sse" else 0.0
+    return {
+        "p50_us": percentile(samples, 50) * 1e6,
+        "p99_us": percentile(samples, 99) * 1e6,
+        "per_chunk_us": per_chunk * 1e6,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--chunks", type=int, default=200)
+    args = parser.parse_args()
+
+    print(
+        f"{'route':<6} {'middleware':<10} {'p50 us':>10} {'p99 us':>10} {'us/chunk':>10}"
+    )
+    for path in ("/json", "/sse"):
+        requests = args.requests if path == "/json" else max(args.requests // 10, 1)
+        for kind in ("base", "asgi"):
+            result = await run(kind, path, requests, args.chunks)
+            print(
+                f"{path:<6} {kind:<10} {result['p50_us']:>10.1f} "
+                f"{result['p99_us']:>10.1f} {result['per_chunk_us']:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
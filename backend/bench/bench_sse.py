@@ -0,0 +1,84 @@
+"""
+ASGI writes and CPU per stream for the chat SSE path.
+
+Compares one ``data:`` string per delta (the previous
+``generate_stream_response`` path) with ``core.sse.SSEEncoder``. Deltas are
+produced in bursts, as they arrive when several tokens land in one read
+from the upstream socket.
+
+    cd backend && python -m bench.bench_sse --streams 50 --tokens 1000
+"""
+
+import argparse
+import asyncio
+import time
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+from bench.bench_middleware import call
+from core.sse import SSEEncoder
+from services.llm import format_sse
+
+
+def build_app(kind: str, tokens: int, burst: int, gap: float) -> FastAPI:
+    app = FastAPI()
+    encoder = SSEEncoder()
+
+    async def deltas():
+        for i in range(tokens):
+            if i % burst == 0:
+                await asyncio.sleep(gap)
+            yield f" tok{i}"
+
+    async def legacy():
+        async for delta in deltas():
+            yield format_sse(delta)
+
+    @app.get("/sse")
+    async def sse_route():
+        if kind == "per-delta":
+            return StreamingResponse(legacy(), media_type="text/plain")
+        return StreamingResponse(
+            encoder.encode(deltas()), media_type="text/event-stream"
+        )
+
+    return app
+
+
+async def run(kind: str, args: argparse.Namespace) -> dict[str, float]:
+    app = build_app(kind, args.tokens, args.burst, args.gap)
+    sends = 0
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    for _ in range(args.streams):
+        sends += await call(app, "/sse")
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+    return {
+        "sends": sends / args.streams,
+        "writes_per_s": sends / wall,
+        "cpu_ms": cpu / args.streams * 1e3,
+        "wall_ms": wall / args.streams * 1e3,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--streams", type=int, default=50)
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--burst", type=int, default=8)
+    parser.add_argument("--gap", type=float, default=0.001)
+    args = parser.parse_args()
+
+    print(f"{'path':<10} {'sends':>8} {'writes/s':>10} {'cpu ms':>8} {'wall ms':>8}")
+    for kind in ("per-delta", "encoder"):
+        result = await run(kind, args)
+        print(
+            f"{kind:<10} {result['sends']:>8.0f} {result['writes_per_s']:>10.0f} "
+            f"{result['cpu_ms']:>8.2f} {result['wall_ms']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
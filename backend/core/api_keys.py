@@ -0,0 +1,169 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import time
+from dataclasses import dataclass, field
+
+# Key files are re-checked for changes at most this often (seconds)
+API_KEYS_RELOAD_INTERVAL = float(os.getenv("API_KEYS_RELOAD_INTERVAL", "5"))
+
+_SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    The caller identified by an API key.
+    """
+
+    tenant_id: str
+    tier: str = "default"
+    scopes: frozenset[str] = field(default_factory=frozenset)
+    key_id: str | None = None
+
+
+LEGACY_PRINCIPAL = Principal(tenant_id="default")
+
+
+@dataclass(frozen=True)
+class _KeyRecord:
+    digest: bytes
+    principal: Principal
+
+
+def hash_api_key(api_key: str) -> str:
+    """
+    Hex SHA-256 of a key; this is what key files store. Keys are random
+    and high-entropy, so a fast hash is enough.
+    """
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+def generate_api_key(prefix_bytes: int = 4) -> tuple[str, str]:
+    """
+    Returns ``(api_key, key_id)``; keys look like ``<key_id>.<secret>``.
+    """
+    key_id = f"bk_{secrets.token_hex(prefix_bytes)}"
+    return f"{key_id}.{secrets.token_urlsafe(32)}", key_id
+
+
+class APIKeyRegistry:
+    """
+    Hashed API keys indexed by their public ``key_id`` prefix.
+
+    A lookup is one dict access plus one SHA-256 and a constant-time
+    compare, however many keys are loaded. Keys come from a JSON file
+    (list of ``{"key_id", "hash", "tenant_id", "tier", "scopes"}``) or a
+    SQLite database with an ``api_keys`` table of the same columns, and are
+    reloaded when the file changes.
+
+    ``legacy_key`` keeps the single ``API_KEY`` env var working; it maps to
+    the ``default`` tenant.
+    """
+
+    def __init__(
+        self,
+        source: str | None = None,
+        legacy_key: str | None = None,
+        reload_interval: float = API_KEYS_RELOAD_INTERVAL,
+    ):
+        self.source = source
+        self._legacy_digest = (
+            hashlib.sha256(legacy_key.encode()).digest() if legacy_key else None
+        )
+        self.reload_interval = reload_interval
+        self._records: dict[str, _KeyRecord] = {}
+        self._mtime: float | None = None
+        self._checked_at = 0.0
+        if source:
+            self.reload()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def authenticate(self, api_key: str | None) -> Principal | None:
+        if not api_key:
+            return None
+        self._maybe_reload()
+        digest = hashlib.sha256(api_key.encode()).digest()
+        key_id, sep, _ = api_key.partition(".")
+        record = self._records.get(key_id) if sep else None
+        if record is not None:
+            if hmac.compare_digest(digest, record.digest):
+                return record.principal
+            return None
+        if self._legacy_digest and hmac.compare_digest(digest, self._legacy_digest):
+            return LEGACY_PRINCIPAL
+        return None
+
+    def reload(self) -> None:
+        assert self.source is not None
+        mtime = self._source_mtime()
+        if self.source.endswith(_SQLITE_SUFFIXES):
+            rows = self._load_sqlite()
+        else:
+            with open(self.source) as file:
+                rows = json.load(file)
+        records = {}
+        for row in rows:
+            scopes = row.get("scopes") or []
+            if isinstance(scopes, str):
+                scopes = scopes.split()
+            records[row["key_id"]] = _KeyRecord(
+                digest=bytes.fromhex(row["hash"]),
+                principal=Principal(
+                    tenant_id=row["tenant_id"],
+                    tier=row.get("tier") or "default",
+                    scopes=frozenset(scopes),
+                    key_id=row["key_id"],
+                ),
+            )
+        # Swap in one assignment so concurrent lookups never see a half load
+        self._records = records
+        self._mtime = mtime
+
+    def _load_sqlite(self) -> list[dict]:
+        assert self.source is not None
+        connection = sqlite3.connect(f"file:{self.source}?mode=ro", uri=True)
+        try:
+            connection.row_factory = sqlite3.Row
+            return [
+                dict(row)
+                for row in connection.execute(
+                    "SELECT key_id, hash, tenant_id, tier, scopes FROM api_keys"
+                )
+            ]
+        finally:
+            connection.close()
+
+    def _source_mtime(self) -> float | None:
+        assert self.source is not None
+        mtimes = []
+        # SQLite in WAL mode writes to the -wal file first
+        for path in (self.source, f"{self.source}-wal"):
+            try:
+                mtimes.append(os.stat(path).st_mtime)
+            except FileNotFoundError:
+                continue
+        return max(mtimes, default=None)
+
+    def _maybe_reload(self) -> None:
+        if not self.source:
+            return
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        if self._source_mtime() != self._mtime:
+            try:
+                self.reload()
+            except (OSError, ValueError, KeyError, sqlite3.Error):
+                # Keep serving the previous keys; a half-written file is
+                # picked up on a later check
+                logger.warning("Failed to reload API keys", exc_info=True)
@@ -0,0 +1,108 @@
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from datetime import UTC, datetime
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Fraction of per-token debug events that are actually logged
+TOKEN_LOG_SAMPLE_RATE = float(os.getenv("TOKEN_LOG_SAMPLE_RATE", "0.01"))
+
+request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+trace_id_var: ContextVar[str | None] = ContextVar("trace_id", default=None)
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class ContextFilter(logging.Filter):
+    """
+    Copies the request-scoped ids onto the record.
+
+    Runs on the calling thread, before the record is queued, so the
+    contextvars of the request are still visible.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = request_id_var.get()
+        if getattr(record, "trace_id", None) is None:
+            record.trace_id = trace_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, UTC).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Never blocks the event loop: records are dropped when the queue is full.
+    """
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Format lazily on the listener thread instead of the caller's
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+_listener: QueueListener | None = None
+
+
+def configure_logging(level: str = LOG_LEVEL) -> None:
+    """
+    Route the root logger through a bounded queue to a background thread
+    that writes JSON lines to stdout.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter())
+    log_queue: queue.Queue[logging.LogRecord] = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """
+    Flush queued records and stop the background thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def sampled(rate: float = TOKEN_LOG_SAMPLE_RATE) -> bool:
+    return rate >= 1 or random.random() < rate
@@ -0,0 +1,319 @@
+import asyncio
+import json
+import os
+import time
+from bisect import bisect_left
+from collections.abc import AsyncIterator, MutableMapping
+from typing import Any
+
+# When set, every worker writes its samples to a shard file in this
+# directory and /metrics aggregates all shards (gunicorn with N workers).
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TOKEN_GAP_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+RATE_BUCKETS = (1, 5, 10, 25, 50, 100, 200, 400, 800)
+
+Labels = tuple[str, ...]
+
+
+class Metric:
+    """
+    Base class; samples are plain dict entries keyed by label values.
+
+    All updates happen on the event loop thread, so no locking is needed.
+    """
+
+    kind = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Labels = (),
+        registry: "Registry | None" = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values: dict[Labels, Any] = {}
+        (registry or default_registry).register(self)
+
+    def snapshot(self) -> list[list[Any]]:
+        return [[list(labels), value] for labels, value in self.values.items()]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) - amount
+
+    def set(self, value: float, *labels: str) -> None:
+        self.values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Labels = (),
+        registry: "Registry | None" = None,
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.buckets = buckets
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value: float, *labels: str) -> None:
+        # [per-bucket counts..., +Inf count, sum]
+        sample = self.values.get(labels)
+        if sample is None:
+            sample = self.values[labels] = [0.0] * (len(self.buckets) + 2)
+        sample[bisect_left(self.buckets, value)] += 1
+        sample[-1] += value
+
+
+class Registry:
+    def __init__(self, directory: str | None = None) -> None:
+        self.directory = directory
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        self.metrics[metric.name] = metric
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "metrics": {
+                name: metric.snapshot() for name, metric in self.metrics.items()
+            },
+        }
+
+    def flush(self) -> None:
+        """
+        Write this worker's shard; readers never see a partial file.
+        """
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, f"metrics-{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.snapshot(), file, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def collect(self) -> list[dict[str, Any]]:
+        if not self.directory:
+            return [self.snapshot()]
+        self.flush()
+        shards = []
+        for filename in os.listdir(self.directory):
+            if not (filename.startswith("metrics-") and filename.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as file:
+                    shards.append(json.load(file))
+            except (OSError, ValueError):
+                continue
+        return shards
+
+    def render(self) -> str:
+        """
+        Prometheus text exposition of all shards aggregated.
+
+        Counters and histograms are summed over every shard (dead workers
+        included, so totals never go backwards); gauges only over workers
+        that are still alive.
+        """
+        merged: dict[str, dict[Labels, Any]] = {name: {} for name in self.metrics}
+        for shard in self.collect():
+            alive = _pid_alive(shard["pid"])
+            for name, samples in shard["metrics"].items():
+                metric = self.metrics.get(name)
+                if metric is None or (metric.kind == "gauge" and not alive):
+                    continue
+                values = merged[name]
+                for labels, value in samples:
+                    key = tuple(labels)
+                    if isinstance(value, list):
+                        current = values.get(key) or [0.0] * len(value)
+                        values[key] = [
+                            a + b for a, b in zip(current, value, strict=True)
+                        ]
+                    else:
+                        values[key] = values.get(key, 0.0) + value
+
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for labels, value in sorted(merged[name].items()):
+                label_pairs = list(zip(metric.labelnames, labels, strict=True))
+                if isinstance(metric, Histogram):
+                    cumulative = 0.0
+                    bounds = [*map(_format_value, metric.buckets), "+Inf"]
+                    for bound, count in zip(bounds, value[:-1], strict=True):
+                        cumulative += count
+                        lines.append(
+                            f"{name}_bucket{_format_labels([*label_pairs, ('le', bound)])} "
+                            f"{_format_value(cumulative)}"
+                        )
+                    lines.append(
+                        f"{name}_sum{_format_labels(label_pairs)} {_format_value(value[-1])}"
+                    )
+                    lines.append(
+                        f"{name}_count{_format_labels(label_pairs)} {_format_value(cumulative)}"
+                    )
+                else:
+                    lines.append(
+                        f"{name}{_format_labels(label_pairs)} {_format_value(value)}"
+                    )
+        return "\n".join(lines) + "\n"
+
+
+async def flush_periodically() -> None:
+    """
+    Background task keeping this worker's shard fresh for other workers'
+    scrapes.
+    """
+    while True:
+        await asyncio.sleep(METRICS_FLUSH_INTERVAL)
+        registry.flush()
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _format_labels(pairs: list[tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    escaped = ",".join(f'{key}="{_escape(value)}"' for key, value in pairs)
+    return "{" + escaped + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+registry = default_registry = Registry(METRICS_DIR)
+
+# =========================
+# HTTP
+# =========================
+
+http_requests_total = Counter(
+    "http_requests_total",
+    "Requests handled, by route template and status code.",
+    ("method", "route", "status"),
+)
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds",
+    "Time until the response headers were sent.",
+    ("method", "route"),
+)
+http_requests_in_flight = Gauge(
+    "http_requests_in_flight",
+    "Requests currently being handled.",
+)
+rate_limit_rejections_total = Counter(
+    "rate_limit_rejections_total",
+    "Requests rejected with 429 by the rate limiter.",
+    ("route",),
+)
+
+jwt_cache_lookups_total = Counter(
+    "jwt_cache_lookups_total",
+    "Verified-token cache lookups, by result (hit/miss).",
+    ("result",),
+)
+
+# =========================
+# STREAMING
+# =========================
+
+llm_time_to_first_token_seconds = Histogram(
+    "llm_time_to_first_token_seconds",
+    "Time from request start to the first streamed token.",
+)
+llm_inter_token_seconds = Histogram(
+    "llm_inter_token_seconds",
+    "Gap between consecutive streamed tokens.",
+    buckets=TOKEN_GAP_BUCKETS,
+)
+llm_tokens_per_second = Histogram(
+    "llm_tokens_per_second",
+    "Streaming rate of completed responses after the first token.",
+    buckets=RATE_BUCKETS,
+)
+llm_stream_tokens_total = Counter(
+    "llm_stream_tokens_total",
+    "Streamed chunks sent to clients.",
+)
+llm_streams_aborted_total = Counter(
+    "llm_streams_aborted_total",
+    "Upstream completions cancelled because no client was reading them.",
+)
+llm_aborted_tokens_total = Counter(
+    "llm_aborted_tokens_total",
+    "Completion tokens received for aborted completions (estimated).",
+)
+
+
+def route_label(scope: MutableMapping[str, Any]) -> str:
+    """
+    Route template (``/message/stream``) rather than the raw path, to keep
+    label cardinality bounded.
+    """
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+async def instrument_stream(
+    stream: AsyncIterator[str], started: float
+) -> AsyncIterator[str]:
+    """
+    Records time-to-first-token, inter-token gaps and tokens/second.
+
+    ``started`` is a ``time.perf_counter()`` timestamp of the request start.
+    """
+    first = last = None
+    tokens = 0
+    async for chunk in stream:
+        now = time.perf_counter()
+        if first is None:
+            first = now
+            llm_time_to_first_token_seconds.observe(now - started)
+        elif last is not None:
+            llm_inter_token_seconds.observe(now - last)
+        last = now
+        tokens += 1
+        yield chunk
+    llm_stream_tokens_total.inc(amount=tokens)
+    if first is not None and last is not None and last > first:
+        llm_tokens_per_second.observe((tokens - 1) / (last - first))
@@ -0,0 +1,65 @@
+import time
+import uuid
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core import metrics
+from core.log import request_id_var
+
+
+class RequestContextMiddleware:
+    """
+    Raw ASGI middleware: request id, logging context and request metrics.
+
+    Unlike ``@app.middleware("http")`` (BaseHTTPMiddleware) it does not
+    run the endpoint in a separate task behind a memory stream; it only
+    inspects ``http.response.start`` and passes body chunks straight
+    through, which matters for long-lived streaming responses.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = str(uuid.uuid4())
+        started = time.perf_counter()
+        # Exposed to handlers as request.state.request_id / .started
+        state = scope.setdefault("state", {})
+        state["request_id"] = request_id
+        state["started"] = started
+        context_token = request_id_var.set(request_id)
+        response_started = False
+
+        async def send_with_request_id(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-request-id", request_id.encode()),
+                ]
+                self._record(scope, message["status"], started)
+            await send(message)
+
+        metrics.http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        except Exception:
+            if not response_started:
+                self._record(scope, 500, started)
+            raise
+        finally:
+            metrics.http_requests_in_flight.dec()
+            request_id_var.reset(context_token)
+
+    @staticmethod
+    def _record(scope: Scope, status: int, started: float) -> None:
+        route = metrics.route_label(scope)
+        metrics.http_requests_total.inc(scope["method"], route, str(status))
+        metrics.http_request_duration_seconds.observe(
+            time.perf_counter() - started, scope["method"], route
+        )
@@ -1,5 +1,70 @@
-from slowapi import Limiter
-from slowapi.util import get_remote_address
-
-# Identifies clients by IP address
-limiter = Limiter(key_func=get_remote_address)
+import os
+from collections.abc import Callable
+
+from fastapi import Request
+from jose import JWTError
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+
+# Registers the "shm://" and "resp://" storage schemes with limits
+from core import rate_limit_storage  # noqa: F401
+from core.rate_limit_policy import RATE_LIMIT_TIERS_FILE, RateLimitPolicy, StreamBudget
+from core.security import api_key_registry, decode_token
+
+# "memory://" is per-process; use "shm://" to share counters between the
+# workers of one host or "resp://host:port" to share them between hosts.
+RATE_LIMIT_STORAGE_URI = os.getenv("RATE_LIMIT_STORAGE_URI", "memory://")
+RATE_LIMIT_STRATEGY = os.getenv("RATE_LIMIT_STRATEGY", "fixed-window")
+
+rate_limit_policy = RateLimitPolicy(source=RATE_LIMIT_TIERS_FILE)
+
+
+def rate_limit_key(request: Request) -> str:
+    """
+    ``<tier>:<identity>`` for the caller: the API key's tenant, then the
+    JWT subject, then the client IP for unauthenticated requests.
+    """
+    cached = getattr(request.state, "rate_limit_key", None)
+    if cached is not None:
+        return str(cached)
+    key = f"anonymous:ip:{get_remote_address(request)}"
+    principal = api_key_registry.authenticate(request.headers.get("x-api-key"))
+    if principal is not None:
+        key = f"{principal.tier}:tenant:{principal.tenant_id}"
+    else:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and token:
+            try:
+                claims = decode_token(token)
+            except JWTError:
+                claims = {}
+            if claims.get("sub"):
+                key = f"{claims.get('tier', 'default')}:user:{claims['sub']}"
+    request.state.rate_limit_key = key
+    return key
+
+
+def tier_of(key: str) -> str:
+    return key.partition(":")[0]
+
+
+def tier_limit(scope: str, default: str) -> Callable[[str], str]:
+    """
+    Limit provider for ``@limiter.limit``: the caller's tier limit for
+    ``scope``, or ``default`` when the tier does not set one.
+    """
+
+    def provider(key: str) -> str:
+        return rate_limit_policy.limit_for(tier_of(key), scope, default)
+
+    return provider
+
+
+# Identifies clients by tenant, user or IP address
+limiter = Limiter(
+    key_func=rate_limit_key,
+    storage_uri=RATE_LIMIT_STORAGE_URI,
+    strategy=RATE_LIMIT_STRATEGY,
+)
+
+stream_budget = StreamBudget(rate_limit_policy, limiter.limiter)
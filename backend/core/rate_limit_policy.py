@@ -0,0 +1,231 @@
+import json
+import logging
+import os
+import time
+import weakref
+from collections.abc import AsyncGenerator, AsyncIterator, Callable
+from dataclasses import dataclass, field
+
+from fastapi import HTTPException, status
+from limits import RateLimitItem, RateLimitItemPerMinute
+from limits.strategies import RateLimiter
+
+from core import metrics
+
+# JSON file of per-tier limits; reloaded when it changes
+RATE_LIMIT_TIERS_FILE = os.getenv("RATE_LIMIT_TIERS_FILE")
+RATE_LIMIT_RELOAD_INTERVAL = float(os.getenv("RATE_LIMIT_RELOAD_INTERVAL", "5"))
+# Streamed tokens are debited from the shared storage in batches of this size
+TOKEN_DEBIT_BATCH = int(os.getenv("TOKEN_DEBIT_BATCH", "16"))
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Tier:
+    """
+    Limits for one tier. ``limits`` maps a route scope to a limit string
+    such as ``"60/minute"``; scopes that are not listed keep the route's
+    default. ``None`` budgets are unlimited.
+    """
+
+    limits: dict[str, str] = field(default_factory=dict)
+    concurrent_streams: int | None = None
+    tokens_per_minute: int | None = None
+
+
+DEFAULT_TIER = Tier()
+
+
+class RateLimitPolicy:
+    """
+    Per-tier limits loaded from a JSON file::
+
+        {
+          "default": {"limits": {"chat": "5/minute"}, "concurrent_streams": 2},
+          "pro": {"limits": {"chat": "60/minute"}, "tokens_per_minute": 200000}
+        }
+
+    Unknown tiers (including ``anonymous`` for unauthenticated callers)
+    use the ``default`` entry.
+    """
+
+    def __init__(
+        self,
+        source: str | None = None,
+        reload_interval: float = RATE_LIMIT_RELOAD_INTERVAL,
+    ):
+        self.source = source
+        self.reload_interval = reload_interval
+        self._tiers: dict[str, Tier] = {}
+        self._mtime: float | None = None
+        self._checked_at = 0.0
+        if source:
+            self.reload()
+
+    def tier(self, name: str) -> Tier:
+        self._maybe_reload()
+        return self._tiers.get(name) or self._tiers.get("default") or DEFAULT_TIER
+
+    def limit_for(self, tier: str, scope: str, default: str) -> str:
+        return self.tier(tier).limits.get(scope, default)
+
+    def load(self, config: dict) -> None:
+        self._tiers = {
+            name: Tier(
+                limits=dict(entry.get("limits") or {}),
+                concurrent_streams=entry.get("concurrent_streams"),
+                tokens_per_minute=entry.get("tokens_per_minute"),
+            )
+            for name, entry in config.items()
+        }
+
+    def reload(self) -> None:
+        assert self.source is not None
+        mtime = os.stat(self.source).st_mtime
+        with open(self.source) as file:
+            self.load(json.load(file))
+        self._mtime = mtime
+
+    def _maybe_reload(self) -> None:
+        if not self.source:
+            return
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        try:
+            if os.stat(self.source).st_mtime != self._mtime:
+                self.reload()
+        except (OSError, ValueError, AttributeError):
+            # Keep the previous tiers until the file is valid again
+            logger.warning("Failed to reload rate limit tiers", exc_info=True)
+
+
+class StreamBudget:
+    """
+    Concurrent-stream and tokens-per-minute budgets for streaming routes.
+
+    Token usage is counted in the limiter's storage, so it is shared
+    between workers like the request limits. Open streams are counted per
+    worker.
+    """
+
+    def __init__(self, policy: RateLimitPolicy, limiter: RateLimiter):
+        self.policy = policy
+        self.limiter = limiter
+        self._open: dict[str, int] = {}
+
+    def open_streams(self, key: str) -> int:
+        return self._open.get(key, 0)
+
+    def admit(
+        self, key: str, tier: str, route: str, prompt_tokens: int = 0
+    ) -> "StreamLease":
+        """
+        Reserve a stream slot for ``key`` or raise 429. The token budget
+        must still cover ``prompt_tokens``.
+        """
+        budget = self.policy.tier(tier)
+        if (
+            budget.concurrent_streams is not None
+            and self.open_streams(key) >= budget.concurrent_streams
+        ):
+            self._reject(route, "Too many concurrent streams", retry_after=1)
+        item = None
+        if budget.tokens_per_minute is not None:
+            item = RateLimitItemPerMinute(budget.tokens_per_minute)
+            if not self.limiter.test(item, key, "tokens", cost=max(prompt_tokens, 1)):
+                self._reject(route, "Token budget exhausted", retry_after=60)
+        self._open[key] = self.open_streams(key) + 1
+        return StreamLease(self, key, item)
+
+    def track(
+        self,
+        stream: AsyncGenerator[str, None],
+        used: Callable[[], int],
+        lease: "StreamLease",
+    ) -> AsyncIterator[str]:
+        """
+        Pass ``stream`` through, debiting the tokens ``used()`` reports.
+        When the budget runs out the upstream is closed, the stream ends
+        and ``lease.exhausted`` is set. The slot is freed when it ends.
+        """
+
+        async def tracked() -> AsyncIterator[str]:
+            try:
+                async for chunk in stream:
+                    yield chunk
+                    if not lease.debit_to(used()):
+                        lease.exhausted = True
+                        break
+            finally:
+                await stream.aclose()
+                lease.debit_to(used(), final=True)
+                lease.release()
+
+        wrapper = tracked()
+        # A response that is dropped before iterating never runs ``finally``
+        weakref.finalize(wrapper, lease.release)
+        return wrapper
+
+    def _release(self, key: str) -> None:
+        remaining = self.open_streams(key) - 1
+        if remaining > 0:
+            self._open[key] = remaining
+        else:
+            self._open.pop(key, None)
+
+    @staticmethod
+    def _reject(route: str, detail: str, retry_after: int) -> None:
+        metrics.rate_limit_rejections_total.inc(route)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=detail,
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class StreamLease:
+    """
+    One admitted stream: its concurrency slot and its token debits.
+    """
+
+    def __init__(self, budget: StreamBudget, key: str, item: RateLimitItem | None):
+        self._budget = budget
+        self._key = key
+        self._item = item
+        self._released = False
+        self.debited = 0
+        self.exhausted = False
+
+    def debit_to(self, total: int, final: bool = False) -> bool:
+        """
+        Debit the tokens used since the last call; False once the budget is
+        exhausted. Small amounts are batched until ``final``.
+        """
+        pending = total - self.debited
+        if self._item is None or pending <= 0:
+            return True
+        if pending < TOKEN_DEBIT_BATCH and not final:
+            return True
+        self.debited = total
+        return self._budget.limiter.hit(self._item, self._key, "tokens", cost=pending)
+
+    def headers(self) -> dict[str, str]:
+        """
+        ``X-TokenBudget-*`` response headers; empty for unlimited tiers.
+        """
+        if self._item is None:
+            return {}
+        stats = self._budget.limiter.get_window_stats(self._item, self._key, "tokens")
+        return {
+            "X-TokenBudget-Limit": str(self._item.amount),
+            "X-TokenBudget-Remaining": str(stats.remaining),
+            "X-TokenBudget-Reset": str(int(stats.reset_time)),
+        }
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._budget._release(self._key)
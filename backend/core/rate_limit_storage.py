@@ -0,0 +1,512 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import socket
+import struct
+import tempfile
+import threading
+import time
+import urllib.parse
+from math import floor
+
+from limits.storage import Storage
+from limits.storage.base import SlidingWindowCounterSupport, TimestampedSlidingWindow
+
+# =========================
+# SHARED MEMORY (single host)
+# =========================
+
+_HEADER = struct.Struct("<8sQd")  # magic, slot count, last sweep timestamp
+_SLOT = struct.Struct("<Qqd")  # key hash, counter, expiry timestamp
+_MAGIC = b"RLSHM001"
+
+
+def _key_hash(key: str) -> int:
+    """
+    64-bit key digest; 0 is reserved for empty slots.
+    """
+    digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest())
+    return digest or 1
+
+
+class SharedMemoryStorage(
+    Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow
+):
+    """
+    Rate limit counters in an mmap-backed open-addressing table.
+
+    Every worker on the host maps the same file, so limits hold across all
+    gunicorn/uvicorn workers and survive worker restarts. Each hit costs a
+    single ``flock`` round-trip; expired slots are reclaimed in one batched
+    sweep per ``sweep_interval`` instead of per key.
+
+    URI: ``shm:///path/to/file?slots=8192&sweep_interval=30``
+    """
+
+    STORAGE_SCHEME = ["shm"]
+
+    def __init__(
+        self,
+        uri: str | None = None,
+        wrap_exceptions: bool = False,
+        **options: float | str | bool,
+    ):
+        parsed = urllib.parse.urlparse(uri or "shm://")
+        query = urllib.parse.parse_qs(parsed.query)
+        self.path = parsed.path or os.path.join(
+            tempfile.gettempdir(), "backend-rate-limit.shm"
+        )
+        self.slots = int(query.get("slots", [options.get("slots", 8192)])[0])
+        self.sweep_interval = float(
+            query.get("sweep_interval", [options.get("sweep_interval", 30)])[0]
+        )
+        self._thread_lock = threading.Lock()
+        self._pid = -1
+        self._fd = -1
+        self._map: mmap.mmap | None = None
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self) -> type[Exception] | tuple[type[Exception], ...]:
+        return (OSError, ValueError)
+
+    # ---- file mapping ----
+
+    def _open(self) -> mmap.mmap:
+        # Re-open after fork: an inherited descriptor shares its flock with
+        # the parent, which would let both processes in at once.
+        if self._map is not None and self._pid == os.getpid():
+            return self._map
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size < _HEADER.size:
+                os.ftruncate(fd, _HEADER.size + self.slots * _SLOT.size)
+                os.pwrite(fd, _HEADER.pack(_MAGIC, self.slots, time.time()), 0)
+            magic, slots, _ = _HEADER.unpack(os.pread(fd, _HEADER.size, 0))
+            if magic != _MAGIC:
+                raise ValueError(f"{self.path} is not a rate limit table")
+            self.slots = slots
+            mapped = mmap.mmap(fd, _HEADER.size + slots * _SLOT.size)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        self._fd, self._map, self._pid = fd, mapped, os.getpid()
+        return mapped
+
+    def _locked(self) -> "_TableLock":
+        return _TableLock(self)
+
+    def _read(self, index: int) -> tuple[int, int, float]:
+        assert self._map is not None
+        return _SLOT.unpack_from(self._map, _HEADER.size + index * _SLOT.size)
+
+    def _write(self, index: int, key_hash: int, count: int, expire_at: float) -> None:
+        assert self._map is not None
+        _SLOT.pack_into(
+            self._map, _HEADER.size + index * _SLOT.size, key_hash, count, expire_at
+        )
+
+    def _find(self, key_hash: int, now: float, create: bool) -> int | None:
+        start = key_hash % self.slots
+        oldest, oldest_expiry = start, float("inf")
+        for step in range(self.slots):
+            index = (start + step) % self.slots
+            slot_hash, _, expire_at = self._read(index)
+            if slot_hash == key_hash:
+                return index
+            if slot_hash == 0:
+                return index if create else None
+            if expire_at < oldest_expiry:
+                oldest, oldest_expiry = index, expire_at
+        if not create:
+            return None
+        # Table full even after sweeping: evict the entry closest to expiry.
+        self._write(oldest, key_hash, 0, 0.0)
+        return oldest
+
+    def _sweep(self, now: float, force: bool = False) -> int:
+        """
+        Rebuild the table without expired entries; returns live entry count.
+        """
+        assert self._map is not None
+        magic, slots, last_sweep = _HEADER.unpack_from(self._map, 0)
+        if not force and now - last_sweep < self.sweep_interval:
+            return -1
+        live = [
+            slot
+            for slot in (self._read(index) for index in range(slots))
+            if slot[0] and slot[2] > now
+        ]
+        self._map[_HEADER.size :] = bytes(slots * _SLOT.size)
+        for key_hash, count, expire_at in live:
+            index = self._find(key_hash, now, create=True)
+            assert index is not None
+            self._write(index, key_hash, count, expire_at)
+        _HEADER.pack_into(self._map, 0, magic, slots, now)
+        return len(live)
+
+    def _get(self, key: str, now: float) -> tuple[int, float]:
+        index = self._find(_key_hash(key), now, create=False)
+        if index is None:
+            return 0, now
+        _, count, expire_at = self._read(index)
+        if expire_at <= now:
+            return 0, now
+        return count, expire_at
+
+    def _incr(self, key: str, expiry: float, amount: int, now: float) -> int:
+        key_hash = _key_hash(key)
+        index = self._find(key_hash, now, create=False)
+        if index is None:
+            self._sweep(now)
+            index = self._find(key_hash, now, create=True)
+            assert index is not None
+        _, count, expire_at = self._read(index)
+        if expire_at <= now:
+            count, expire_at = 0, now + expiry
+        count += amount
+        self._write(index, key_hash, count, expire_at)
+        return count
+
+    # ---- limits.storage.Storage ----
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        with self._locked():
+            return self._incr(key, expiry, amount, time.time())
+
+    def get(self, key: str) -> int:
+        with self._locked():
+            return self._get(key, time.time())[0]
+
+    def get_expiry(self, key: str) -> float:
+        with self._locked():
+            return self._get(key, time.time())[1]
+
+    def check(self) -> bool:
+        try:
+            with self._locked():
+                return True
+        except self.base_exceptions:
+            return False
+
+    def reset(self) -> int | None:
+        with self._locked():
+            now = time.time()
+            live = self._sweep(now, force=True)
+            assert self._map is not None
+            self._map[_HEADER.size :] = bytes(self.slots * _SLOT.size)
+            return live
+
+    def clear(self, key: str) -> None:
+        with self._locked():
+            index = self._find(_key_hash(key), time.time(), create=False)
+            if index is not None:
+                self._write(index, self._read(index)[0], 0, 0.0)
+
+    # ---- sliding window counter ----
+
+    def _window(
+        self, key: str, expiry: int, now: float
+    ) -> tuple[int, float, int, float]:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous_count = self._get(previous_key, now)[0]
+        current_count = self._get(current_key, now)[0]
+        return _window_info(previous_count, current_count, expiry, now)
+
+    def acquire_sliding_window_entry(
+        self, key: str, limit: int, expiry: int, amount: int = 1
+    ) -> bool:
+        if amount > limit:
+            return False
+        with self._locked():
+            now = time.time()
+            previous_count, previous_ttl, current_count, _ = self._window(
+                key, expiry, now
+            )
+            if (
+                floor(previous_count * previous_ttl / expiry + current_count) + amount
+                > limit
+            ):
+                return False
+            _, current_key = self.sliding_window_keys(key, expiry, now)
+            self._incr(current_key, 2 * expiry, amount, now)
+            return True
+
+    def get_sliding_window(
+        self, key: str, expiry: int
+    ) -> tuple[int, float, int, float]:
+        with self._locked():
+            return self._window(key, expiry, time.time())
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        for window_key in self.sliding_window_keys(key, expiry, time.time()):
+            self.clear(window_key)
+
+
+class _TableLock:
+    """
+    Thread lock plus an exclusive ``flock`` on the shared table file.
+    """
+
+    def __init__(self, storage: SharedMemoryStorage):
+        self.storage = storage
+
+    def __enter__(self) -> None:
+        self.storage._thread_lock.acquire()
+        try:
+            self.storage._open()
+            fcntl.flock(self.storage._fd, fcntl.LOCK_EX)
+        except BaseException:
+            self.storage._thread_lock.release()
+            raise
+
+    def __exit__(self, *exc_info: object) -> None:
+        try:
+            fcntl.flock(self.storage._fd, fcntl.LOCK_UN)
+        finally:
+            self.storage._thread_lock.release()
+
+
+def _window_info(
+    previous_count: int, current_count: int, expiry: int, now: float
+) -> tuple[int, float, int, float]:
+    """
+    Same TTL arithmetic as ``limits.storage.MemoryStorage``.
+    """
+    previous_ttl = (
+        (1 - (((now - expiry) / expiry) % 1)) * expiry if previous_count else 0.0
+    )
+    current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+    return previous_count, previous_ttl, current_count, current_ttl
+
+
+# =========================
+# REDIS PROTOCOL (multi host)
+# =========================
+
+
+class RespError(Exception):
+    """
+    Error reply returned by a Redis-protocol server.
+    """
+
+
+class RespStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """
+    Rate limit counters on any server speaking RESP (Redis, Valkey, KeyDB).
+
+    Commands for a hit are pipelined so a request costs one network
+    round-trip. Counters are created with ``SET NX PX`` and bumped with
+    ``INCRBY``, so the increment is atomic on the server and expiry is
+    handled server-side.
+
+    URI: ``resp://[:password@]host:port[/db]?prefix=rl:&timeout=0.5``
+    """
+
+    STORAGE_SCHEME = ["resp"]
+
+    def __init__(
+        self,
+        uri: str | None = None,
+        wrap_exceptions: bool = False,
+        **options: float | str | bool,
+    ):
+        parsed = urllib.parse.urlparse(uri or "resp://localhost:6379")
+        query = urllib.parse.parse_qs(parsed.query)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.strip("/") or 0)
+        self.prefix = query.get("prefix", [str(options.get("prefix", "rl:"))])[0]
+        self.timeout = float(query.get("timeout", [options.get("timeout", 0.5)])[0])
+        self._local = threading.local()
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self) -> type[Exception] | tuple[type[Exception], ...]:
+        return (OSError, RespError)
+
+    # ---- connection ----
+
+    def _connection(self) -> tuple[socket.socket, "_RespReader"]:
+        conn: tuple[socket.socket, _RespReader] | None = getattr(
+            self._local, "conn", None
+        )
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = (sock, _RespReader(sock))
+        self._local.conn, self._local.pid = conn, os.getpid()
+        setup: list[tuple[object, ...]] = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            self._pipeline(*setup)
+        return conn
+
+    def _pipeline(self, *commands: tuple[object, ...]) -> list[object]:
+        sock, reader = self._connection()
+        try:
+            sock.sendall(b"".join(_encode(command) for command in commands))
+            replies = [reader.read() for _ in commands]
+        except OSError:
+            sock.close()
+            self._local.conn = None
+            raise
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def _incr_commands(
+        self, key: str, expiry: float, amount: int
+    ) -> list[tuple[object, ...]]:
+        return [
+            ("SET", key, 0, "PX", int(expiry * 1000), "NX"),
+            ("INCRBY", key, amount),
+            ("PTTL", key),
+        ]
+
+    def _fix_expiry(self, key: str, expiry: float, ttl: object) -> None:
+        # The key expired between SET NX and INCRBY; INCRBY recreated it
+        # without a TTL.
+        if ttl == -1:
+            self._pipeline(("PEXPIRE", key, int(expiry * 1000)))
+
+    # ---- limits.storage.Storage ----
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        key = self._key(key)
+        _, count, ttl = self._pipeline(*self._incr_commands(key, expiry, amount))
+        self._fix_expiry(key, expiry, ttl)
+        return _int(count)
+
+    def get(self, key: str) -> int:
+        (value,) = self._pipeline(("GET", self._key(key)))
+        return _int(value)
+
+    def get_expiry(self, key: str) -> float:
+        (ttl,) = self._pipeline(("PTTL", self._key(key)))
+        now = time.time()
+        return now + ttl / 1000 if isinstance(ttl, int) and ttl > 0 else now
+
+    def check(self) -> bool:
+        try:
+            return self._pipeline(("PING",)) == ["PONG"]
+        except self.base_exceptions:
+            return False
+
+    def reset(self) -> int | None:
+        (keys,) = self._pipeline(("KEYS", f"{self.prefix}*"))
+        if not keys:
+            return 0
+        (removed,) = self._pipeline(("DEL", *keys))  # type: ignore[misc]
+        return _int(removed)
+
+    def clear(self, key: str) -> None:
+        self._pipeline(("DEL", self._key(key)))
+
+    # ---- sliding window counter ----
+
+    def acquire_sliding_window_entry(
+        self, key: str, limit: int, expiry: int, amount: int = 1
+    ) -> bool:
+        if amount > limit:
+            return False
+        now = time.time()
+        previous_key, current_key = (
+            self._key(window_key)
+            for window_key in self.sliding_window_keys(key, expiry, now)
+        )
+        # Increment first and roll back on rejection: one round-trip for
+        # accepted hits and no check-then-act race between workers.
+        _, current_count, ttl, previous_count = self._pipeline(
+            *self._incr_commands(current_key, 2 * expiry, amount),
+            ("GET", previous_key),
+        )
+        self._fix_expiry(current_key, 2 * expiry, ttl)
+        previous, previous_ttl, current, _ = _window_info(
+            _int(previous_count),
+            _int(current_count),
+            expiry,
+            now,
+        )
+        if floor(previous * previous_ttl / expiry + current) > limit:
+            self._pipeline(("DECRBY", current_key, amount))
+            return False
+        return True
+
+    def get_sliding_window(
+        self, key: str, expiry: int
+    ) -> tuple[int, float, int, float]:
+        now = time.time()
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous_count, current_count = self._pipeline(
+            ("GET", self._key(previous_key)), ("GET", self._key(current_key))
+        )
+        return _window_info(
+            _int(previous_count),
+            _int(current_count),
+            expiry,
+            now,
+        )
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        self._pipeline(
+            (
+                "DEL",
+                *(
+                    self._key(window_key)
+                    for window_key in self.sliding_window_keys(key, expiry, time.time())
+                ),
+            )
+        )
+
+
+def _int(reply: object) -> int:
+    return int(reply) if isinstance(reply, int | str) else 0
+
+
+def _encode(command: tuple[object, ...]) -> bytes:
+    parts = [f"*{len(command)}\r\n".encode()]
+    for arg in command:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+class _RespReader:
+    """
+    Minimal RESP2 reply parser over a buffered socket.
+    """
+
+    def __init__(self, sock: socket.socket):
+        self._file = sock.makefile("rb")
+
+    def read(self) -> object:
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("RESP server closed the connection")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            return RespError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            return self._file.read(length + 2)[:-2].decode()
+        if kind == b"*":
+            length = int(payload)
+            return None if length < 0 else [self.read() for _ in range(length)]
+        raise RespError(f"Unexpected RESP reply: {line!r}")
@@ -7,6 +7,10 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import APIKeyHeader, OAuth2PasswordBearer
 from jose import JWTError, jwt
 
+from core import metrics
+from core.api_keys import APIKeyRegistry, Principal
+from core.token_cache import VerifiedTokenCache
+
 load_dotenv()
 
 # =========================
@@ -14,16 +18,22 @@ load_dotenv()
 # =========================
 
 API_KEY = os.getenv("API_KEY")
+# JSON file or SQLite database of hashed per-tenant keys (see core.api_keys)
+API_KEYS_SOURCE = os.getenv("API_KEYS_SOURCE")
 
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
+api_key_registry = APIKeyRegistry(source=API_KEYS_SOURCE, legacy_key=API_KEY)
+
 
-def verify_api_key(api_key: str = Depends(api_key_header)) -> None:
-    if api_key != API_KEY:
+def verify_api_key(api_key: str | None = Depends(api_key_header)) -> Principal:
+    principal = api_key_registry.authenticate(api_key)
+    if principal is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or missing API key",
         )
+    return principal
 
 
 # =========================
@@ -36,9 +46,13 @@ if not SECRET_KEY_RAW:
 SECRET_KEY: str = SECRET_KEY_RAW
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Verified claims by token digest, so reused tokens skip jwt.decode
+token_cache = VerifiedTokenCache(maxsize=JWT_CACHE_SIZE)
+
 
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
@@ -47,9 +61,24 @@ def create_access_token(data: dict) -> str:
     return str(jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM))
 
 
+def decode_token(token: str) -> dict:
+    if token_cache.is_revoked(token):
+        raise JWTError("Token revoked")
+    payload = token_cache.get(token)
+    if payload is not None:
+        metrics.jwt_cache_lookups_total.inc("hit")
+        return payload
+    metrics.jwt_cache_lookups_total.inc("miss")
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    if token_cache.is_rejected(payload):
+        raise JWTError("Token revoked")
+    token_cache.put(token, payload)
+    return payload
+
+
 def get_current_user(token: str = Depends(oauth2_scheme)) -> str:
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         username = payload.get("sub")
         if not username or not isinstance(username, str):
             raise HTTPException(status_code=401)
@@ -60,3 +89,17 @@ def get_current_user(token: str = Depends(oauth2_scheme)) -> str:
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token",
         ) from err
+
+
+def revoke_token(token: str) -> None:
+    """
+    Reject ``token`` on every later request handled by this worker.
+    """
+    try:
+        claims = jwt.get_unverified_claims(token)
+    except JWTError:
+        claims = {}
+    expires_at = claims.get("exp")
+    token_cache.revoke(
+        token, float(expires_at) if isinstance(expires_at, int | float) else None
+    )
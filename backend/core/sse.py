@@ -0,0 +1,129 @@
+import asyncio
+import os
+from collections.abc import AsyncIterator, Callable
+from contextlib import suppress
+
+# Deltas arriving within this window (seconds) or up to this many
+# characters are sent as one event; 0 only merges deltas already queued
+SSE_FLUSH_INTERVAL = float(os.getenv("SSE_FLUSH_INTERVAL", "0.01"))
+SSE_FLUSH_BYTES = int(os.getenv("SSE_FLUSH_BYTES", "4096"))
+# Deltas read ahead of a slow client before the upstream read is paused
+SSE_READ_AHEAD = int(os.getenv("SSE_READ_AHEAD", "256"))
+
+_END = object()
+
+
+class _Failed:
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+def encode_event(
+    data: str, event: str | None = None, event_id: str | None = None
+) -> bytes:
+    """
+    One Server-Sent Event. Each line of ``data`` becomes its own ``data:``
+    field, so newlines inside a token survive the round trip.
+    """
+    fields = []
+    if event is not None:
+        fields.append(f"event: {event}\n")
+    if event_id is not None:
+        fields.append(f"id: {event_id}\n")
+    for line in data.replace("\r\n", "\n").replace("\r", "\n").split("\n"):
+        fields.append(f"data: {line}\n")
+    fields.append("\n")
+    return "".join(fields).encode()
+
+
+class SSEEncoder:
+    """
+    Turns a stream of text deltas into SSE bytes with few writes.
+
+    The deltas are read by a background task into a bounded queue; each
+    write carries every delta that arrived within ``flush_interval`` of
+    the first one, up to ``flush_bytes``. A client that reads slowly
+    therefore gets larger, fewer events, and once ``read_ahead`` deltas
+    are waiting the upstream read stops until the client catches up.
+
+    Events are numbered by the count of deltas sent so far, which is what
+    a client echoes back as ``Last-Event-ID``.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = SSE_FLUSH_INTERVAL,
+        flush_bytes: int = SSE_FLUSH_BYTES,
+        read_ahead: int = SSE_READ_AHEAD,
+    ):
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.read_ahead = read_ahead
+
+    async def encode(
+        self,
+        deltas: AsyncIterator[str],
+        last_event: Callable[[], str | None] | None = None,
+        first_id: int = 0,
+    ) -> AsyncIterator[bytes]:
+        """
+        SSE bytes for ``deltas``. ``last_event()`` is called once the
+        deltas end and may name a final, empty event (e.g. why the stream
+        was cut).
+        """
+        queue: asyncio.Queue[object] = asyncio.Queue(self.read_ahead)
+
+        async def pump() -> None:
+            try:
+                async for delta in deltas:
+                    await queue.put(delta)
+            except Exception as error:
+                await queue.put(_Failed(error))
+            else:
+                await queue.put(_END)
+
+        task = asyncio.create_task(pump())
+        loop = asyncio.get_running_loop()
+        sequence = first_id
+        pending: object = None
+        try:
+            while True:
+                item = pending if pending is not None else await queue.get()
+                pending = None
+                parts: list[str] = []
+                size = 0
+                deadline = loop.time() + self.flush_interval
+                while True:
+                    while isinstance(item, str) and size < self.flush_bytes:
+                        parts.append(item)
+                        size += len(item)
+                        item = None if queue.empty() else queue.get_nowait()
+                    if item is not None or size >= self.flush_bytes:
+                        break
+                    # One timer per event rather than one wakeup per delta
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    await asyncio.sleep(timeout)
+                    if queue.empty():
+                        break
+                    item = queue.get_nowait()
+                if parts:
+                    sequence += len(parts)
+                    yield encode_event("".join(parts), event_id=str(sequence))
+                if isinstance(item, str):
+                    pending = item
+                elif isinstance(item, _Failed):
+                    raise item.error
+                elif item is _END:
+                    break
+            event = last_event() if last_event is not None else None
+            if event is not None:
+                yield encode_event("", event=event)
+        finally:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+
+sse_encoder = SSEEncoder()
@@ -1,5 +1,10 @@
+import logging
 from collections.abc import Generator
 
+from core.log import sampled
+
+logger = logging.getLogger(__name__)
+
 
 def stream_tokens(
     tokens: list[str], trace_id: str | None = None
@@ -7,9 +12,12 @@ def stream_tokens(
     """
     Simulates token-by-token streaming.
     Each token is sent as a Server-Sent Event (SSE).
-    Optionally logs trace info.
+    Optionally logs trace info (sampled, at DEBUG level).
     """
+    trace = trace_id is not None and logger.isEnabledFor(logging.DEBUG)
     for token in tokens:
-        if trace_id:
-            print(f"[TRACE {trace_id}] Streaming token: {token}")
+        if trace and sampled():
+            logger.debug(
+                "Streaming token", extra={"trace_id": trace_id, "token": token}
+            )
         yield f"data: {token}\n\n"
@@ -0,0 +1,90 @@
+import hashlib
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+Claims = dict[str, Any]
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of already-verified JWT claims, keyed by token digest.
+
+    Entries live until the token's ``exp`` so a client reusing a bearer
+    token pays for signature verification once. Revoked tokens are kept on
+    a deny list until they would have expired anyway, and revocation hooks
+    can reject cached claims (e.g. a disabled user) without a flush.
+    """
+
+    def __init__(self, maxsize: int = 10_000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[bytes, tuple[Claims, float]] = OrderedDict()
+        self._revoked: dict[bytes, float] = {}
+        self._hooks: list[Callable[[Claims], bool]] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Claims | None:
+        key = self.digest(token)
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        claims = entry[0]
+        if self.is_rejected(claims):
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    def put(self, token: str, claims: Claims) -> None:
+        expires_at = claims.get("exp")
+        if not isinstance(expires_at, int | float) or self.maxsize <= 0:
+            return
+        key = self.digest(token)
+        self._entries[key] = (claims, float(expires_at))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def is_revoked(self, token: str) -> bool:
+        if not self._revoked:
+            return False
+        now = time.time()
+        for key in [key for key, until in self._revoked.items() if until <= now]:
+            del self._revoked[key]
+        return self.digest(token) in self._revoked
+
+    def revoke(self, token: str, expires_at: float | None = None) -> None:
+        """
+        Reject ``token`` from now on; kept until ``expires_at`` (its ``exp``).
+        """
+        key = self.digest(token)
+        entry = self._entries.pop(key, None)
+        if expires_at is None:
+            expires_at = entry[1] if entry else time.time() + 24 * 3600
+        self._revoked[key] = expires_at
+
+    def is_rejected(self, claims: Claims) -> bool:
+        return any(hook(claims) for hook in self._hooks)
+
+    def add_revocation_hook(self, hook: Callable[[Claims], bool]) -> None:
+        """
+        ``hook(claims)`` returning True rejects a cached token.
+        """
+        self._hooks.append(hook)
+
+    def clear(self) -> None:
+        self._entries.clear()
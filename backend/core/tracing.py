@@ -2,6 +2,8 @@ import uuid
 
 from fastapi import Depends
 
+from core.log import trace_id_var
+
 
 def create_trace_id() -> str:
     """
@@ -12,6 +14,8 @@ def create_trace_id() -> str:
 
 def get_trace_id(trace_id: str = Depends(create_trace_id)) -> str:
     """
-    Dependency that provides a request-scoped trace ID.
+    Dependency that provides a request-scoped trace ID and binds it to the
+    logging context.
     """
+    trace_id_var.set(trace_id)
     return trace_id
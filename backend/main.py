@@ -1,33 +1,54 @@
-import uuid
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 
 import uvicorn
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from slowapi.errors import RateLimitExceeded
 
+from core import metrics
+from core.log import configure_logging, shutdown_logging
+from core.middleware import RequestContextMiddleware
 from core.rate_limit import limiter
 from routers import api_key_auth, chat, health, oauth, public
+from routers import metrics as metrics_router
+from services.llm import close_client, get_client
 
-app = FastAPI(title="Backend API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    configure_logging()
+    # Open the upstream connection pool once per worker, close it on shutdown
+    get_client()
+    flush_task = (
+        asyncio.create_task(metrics.flush_periodically())
+        if metrics.METRICS_DIR
+        else None
+    )
+    yield
+    if flush_task is not None:
+        flush_task.cancel()
+        metrics.registry.flush()
+    await close_client()
+    shutdown_logging()
+
+
+app = FastAPI(title="Backend API", lifespan=lifespan)
 
 app.state.limiter = limiter
 
 
 @app.exception_handler(RateLimitExceeded)
 def rate_limit_handler(request: Request, exc: RateLimitExceeded):
+    metrics.rate_limit_rejections_total.inc(metrics.route_label(request.scope))
     return JSONResponse(
         status_code=429,
         content={"detail": "Rate limit exceeded"},
     )
 
 
-@app.middleware("http")
-async def add_request_id(request: Request, call_next):
-    request_id = str(uuid.uuid4())
-    request.state.request_id = request_id
-    response = await call_next(request)
-    response.headers["X-Request-Id"] = request_id
-    return response
+app.add_middleware(RequestContextMiddleware)
 
 
 # Include routers
@@ -36,6 +57,7 @@ app.include_router(chat.router)
 app.include_router(public.router)
 app.include_router(api_key_auth.router)
 app.include_router(oauth.router)
+app.include_router(metrics_router.router)
 
 
 if __name__ == "__main__":
@@ -1,31 +1,109 @@
-from fastapi import APIRouter, Depends, Request
+import logging
+import uuid
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
 from fastapi.responses import StreamingResponse
 
-from core.rate_limit import limiter
+from core.api_keys import Principal
+from core.metrics import instrument_stream, route_label
+from core.rate_limit import (
+    limiter,
+    rate_limit_key,
+    stream_budget,
+    tier_limit,
+    tier_of,
+)
 from core.security import verify_api_key
+from core.sse import sse_encoder
 from schemas.chat import Prompt
-from services.llm import generate_stream_response
+from services.llm import chat_deltas
+from services.resume import RESUMABLE_STREAMS, resume_buffers
+from services.tokens import TokenUsage, estimate_tokens
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
 
 @router.post("/message/stream")
-@limiter.limit("5/minute")
+@limiter.limit(tier_limit("chat", "5/minute"))
 async def chat_message_stream(
     request: Request,
     prompt: Prompt,
-    _: None = Depends(verify_api_key),
+    _: Principal = Depends(verify_api_key),
     # __: str = Depends(get_current_user),
 ):
-    request_id = request.state.request_id
-    print(f"Request ID: {request_id}")
+    logger.info("Chat stream requested")
+    key = rate_limit_key(request)
+    usage = TokenUsage()
+    lease = stream_budget.admit(
+        key,
+        tier_of(key),
+        route_label(request.scope),
+        prompt_tokens=estimate_tokens(prompt.text),
+    )
+    deltas = stream_budget.track(chat_deltas(prompt, usage), lambda: usage.total, lease)
+    headers = lease.headers()
+
+    def last_event() -> str | None:
+        return "budget_exhausted" if lease.exhausted else None
+
+    if RESUMABLE_STREAMS:
+        stream_id = uuid.uuid4().hex
+        stream = resume_buffers.start(stream_id, _owner(key), deltas, last_event)
+        deltas = stream.subscribe()
+        headers["X-Stream-Id"] = stream_id
+
+    return StreamingResponse(
+        sse_encoder.encode(
+            instrument_stream(deltas, request.state.started),
+            last_event=last_event,
+        ),
+        media_type="text/event-stream",
+        headers=headers,
+    )
+
+
+@router.get("/message/stream/{stream_id}")
+@limiter.limit(tier_limit("chat_resume", "30/minute"))
+async def resume_chat_stream(
+    request: Request,
+    stream_id: str,
+    last_event_id: str | None = Header(default=None),
+    _: Principal = Depends(verify_api_key),
+):
+    """
+    Continues a stream from ``/message/stream`` after the client dropped:
+    replays the events after ``Last-Event-ID``, then follows it live.
+    """
+    stream = resume_buffers.get(stream_id, _owner(rate_limit_key(request)))
+    if stream is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Unknown or expired stream",
+        )
+    after = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+    if after < stream.broadcast.offset:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Stream events before Last-Event-ID are no longer buffered",
+        )
+    logger.info("Chat stream resumed", extra={"stream_id": stream_id})
 
     return StreamingResponse(
-        generate_stream_response(prompt),
-        media_type="text/plain",
+        sse_encoder.encode(
+            stream.subscribe(after), last_event=stream.last_event, first_id=after
+        ),
+        media_type="text/event-stream",
+        headers={"X-Stream-Id": stream_id},
     )
 
 
+def _owner(key: str) -> str:
+    # The rate limit key without its tier prefix
+    return key.partition(":")[2]
+
+
 # @router.post("/message", response_model=ChatResponse)
 # @limiter.limit("5/minute")
 # def chat_message(
@@ -1,18 +1,29 @@
+import logging
+
 from fastapi import APIRouter, Depends, Request
 
-from core.rate_limit import limiter
+from core.api_keys import Principal
+from core.rate_limit import limiter, tier_limit
 from core.security import verify_api_key
+from services.llm import pool_stats
 
 router = APIRouter(prefix="/health", tags=["Health"])
 
+logger = logging.getLogger(__name__)
+
 
 @router.get("")
-@limiter.limit("10/minute")
+@limiter.limit(tier_limit("health", "10/minute"))
 def health_check(
     request: Request,
-    _: None = Depends(verify_api_key),
+    _: Principal = Depends(verify_api_key),
     # __: str = Depends(get_current_user)
 ):
     request_id = request.state.request_id
-    print(f"Request ID: {request_id}")
-    return {"status": "ok", "service": "backend-api", "request_id": request_id}
+    logger.debug("Health check")
+    return {
+        "status": "ok",
+        "service": "backend-api",
+        "request_id": request_id,
+        "upstream_pool": pool_stats(),
+    }
@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from core.metrics import registry
+
+router = APIRouter(tags=["Metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics_endpoint():
+    return PlainTextResponse(
+        registry.render(),
+        media_type="text/plain; version=0.0.4",
+    )
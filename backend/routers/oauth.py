@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 
-from core.rate_limit import limiter
+from core.rate_limit import limiter, tier_limit
 from core.security import create_access_token, get_current_user
 from schemas.auth import Token
 
@@ -9,7 +9,7 @@ router = APIRouter(tags=["OAuth"])
 
 
 @router.post("/token", response_model=Token)
-@limiter.limit("5/minute")
+@limiter.limit(tier_limit("token", "5/minute"))
 def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
     if form_data.username != "admin" or form_data.password != "admin":
         raise HTTPException(
@@ -23,6 +23,6 @@ def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
 
 
 @router.get("/oauth-protected")
-@limiter.limit("10/minute")
+@limiter.limit(tier_limit("oauth", "10/minute"))
 def oauth_protected(request: Request, user: str = Depends(get_current_user)):
     return {"message": f"Hello {user}, rate-limited & authenticated"}
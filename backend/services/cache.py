@@ -0,0 +1,209 @@
+import hashlib
+import json
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any
+
+_WHITESPACE = re.compile(r"\s+")
+_WORD = re.compile(r"\w+")
+
+# Mersenne prime used by the MinHash universal hash family
+_MINHASH_PRIME = (1 << 61) - 1
+
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form of a prompt: NFKC, case-folded, collapsed whitespace.
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def cache_key(
+    text: str, model: str, temperature: float, metadata: dict[str, Any] | None
+) -> tuple[str, str]:
+    """
+    Returns ``(partition, key)``.
+
+    The partition covers everything except the prompt text (model,
+    temperature, metadata); near-duplicate matching only happens inside one
+    partition. The key additionally covers the normalized text.
+    """
+    partition = json.dumps(
+        [model, temperature, metadata or {}],
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    digest = hashlib.blake2b(
+        f"{partition}\0{normalize_text(text)}".encode(), digest_size=16
+    )
+    return partition, digest.hexdigest()
+
+
+class MinHasher:
+    """
+    MinHash signatures over word shingles, bucketed for LSH lookup.
+
+    Two prompts whose shingle sets have Jaccard similarity ``s`` share at
+    least one band with probability ``1 - (1 - s**rows)**bands``.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, shingle_size: int = 2):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        seed = hashlib.blake2b(b"minhash", digest_size=64).digest()
+        self._coefficients = [
+            (
+                int.from_bytes(hashlib.blake2b(seed + bytes([i, 0])).digest()[:8])
+                % _MINHASH_PRIME
+                | 1,
+                int.from_bytes(hashlib.blake2b(seed + bytes([i, 1])).digest()[:8])
+                % _MINHASH_PRIME,
+            )
+            for i in range(num_perm)
+        ]
+
+    def shingles(self, text: str) -> set[int]:
+        words = _WORD.findall(normalize_text(text))
+        size = min(self.shingle_size, len(words)) or 1
+        grams = {
+            " ".join(words[i : i + size]) for i in range(max(len(words) - size + 1, 1))
+        }
+        return {
+            int.from_bytes(hashlib.blake2b(g.encode(), digest_size=8).digest())
+            for g in grams
+        }
+
+    def signature(self, text: str) -> tuple[int, ...]:
+        shingles = self.shingles(text)
+        return tuple(
+            min((a * s + b) % _MINHASH_PRIME for s in shingles)
+            for a, b in self._coefficients
+        )
+
+    def bands_of(self, signature: tuple[int, ...]) -> list[tuple[int, ...]]:
+        return [
+            (band, *signature[band * self.rows : (band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+    @staticmethod
+    def similarity(first: tuple[int, ...], second: tuple[int, ...]) -> float:
+        return sum(a == b for a, b in zip(first, second, strict=True)) / len(first)
+
+
+@dataclass
+class CacheEntry:
+    partition: str
+    chunks: list[str]
+    size: int
+    expires_at: float
+    signature: tuple[int, ...] | None = None
+    hits: int = field(default=0)
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache of completed streamed responses with a byte budget.
+
+    ``near_duplicates`` enables MinHash matching so paraphrased prompts
+    ("how do I reset my password?" / "how can I reset my password") reuse
+    the same completion when their estimated similarity reaches
+    ``similarity_threshold``.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 16 * 1024 * 1024,
+        max_entries: int = 10_000,
+        ttl: float = 300.0,
+        near_duplicates: bool = False,
+        similarity_threshold: float = 0.8,
+    ):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.minhash = MinHasher() if near_duplicates else None
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._buckets: dict[tuple[str, tuple[int, ...]], set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, partition: str, key: str, text: str) -> list[str] | None:
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= now:
+            self._remove(key)
+            entry = None
+        if entry is None and self.minhash is not None:
+            key = self._nearest(partition, text, now) or key
+            entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        entry.hits += 1
+        self.hits += 1
+        return entry.chunks
+
+    def put(self, partition: str, key: str, text: str, chunks: list[str]) -> None:
+        size = sum(len(chunk.encode()) for chunk in chunks)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        signature = self.minhash.signature(text) if self.minhash else None
+        self._entries[key] = CacheEntry(
+            partition, chunks, size, time.monotonic() + self.ttl, signature
+        )
+        self.size += size
+        if self.minhash is not None and signature is not None:
+            for band in self.minhash.bands_of(signature):
+                self._buckets.setdefault((partition, band), set()).add(key)
+        while self.size > self.max_bytes or len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._buckets.clear()
+        self.size = 0
+
+    def _nearest(self, partition: str, text: str, now: float) -> str | None:
+        assert self.minhash is not None
+        signature = self.minhash.signature(text)
+        candidates: set[str] = set()
+        for band in self.minhash.bands_of(signature):
+            candidates |= self._buckets.get((partition, band), set())
+        best, best_score = None, self.similarity_threshold
+        for candidate in candidates:
+            entry = self._entries[candidate]
+            if entry.expires_at <= now or entry.signature is None:
+                continue
+            score = self.minhash.similarity(signature, entry.signature)
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.size -= entry.size
+        if self.minhash is not None and entry.signature is not None:
+            for band in self.minhash.bands_of(entry.signature):
+                bucket = self._buckets.get((entry.partition, band))
+                if bucket is not None:
+                    bucket.discard(key)
+                    if not bucket:
+                        del self._buckets[(entry.partition, band)]
@@ -0,0 +1,169 @@
+import asyncio
+from collections import deque
+from collections.abc import AsyncIterator, Callable
+from itertools import islice
+
+_END = object()
+
+
+class StreamGap(Exception):
+    """
+    The items a subscriber needs were already dropped from the history.
+    """
+
+
+class _Subscriber:
+    def __init__(self, buffer_size: int):
+        self.queue: asyncio.Queue[object] = asyncio.Queue(maxsize=buffer_size)
+        # Set when the queue overflowed; the subscriber then catches up from
+        # the broadcast history instead of blocking the producer.
+        self.lagging = False
+
+
+class StreamBroadcast:
+    """
+    Consumes one source stream and fans it out to any number of subscribers.
+
+    Items are kept in ``history`` so subscribers that join late replay
+    what was already received before switching to live items. Each
+    subscriber has a bounded queue; a slow subscriber never stalls the
+    source or the other subscribers.
+
+    With ``history_limit`` only the newest items are kept; ``offset`` counts
+    the ones dropped, so item positions stay absolute.
+    """
+
+    def __init__(
+        self,
+        source: AsyncIterator[str],
+        buffer_size: int = 256,
+        history_limit: int | None = None,
+    ):
+        self.history: deque[str] = deque()
+        self.history_limit = history_limit
+        self.offset = 0
+        # Characters held in ``history``
+        self.size = 0
+        self.done = False
+        self.error: BaseException | None = None
+        self.buffer_size = buffer_size
+        self._subscribers: set[_Subscriber] = set()
+        self.task = asyncio.create_task(self._pump(source))
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def end(self) -> int:
+        """
+        Position after the last item received.
+        """
+        return self.offset + len(self.history)
+
+    def trim(self, limit: int) -> None:
+        """
+        Keep at most the newest ``limit`` items from now on.
+        """
+        self.history_limit = limit
+        while len(self.history) > limit:
+            self.size -= len(self.history.popleft())
+            self.offset += 1
+
+    async def _pump(self, source: AsyncIterator[str]) -> None:
+        try:
+            async for item in source:
+                self.history.append(item)
+                self.size += len(item)
+                if self.history_limit is not None:
+                    self.trim(self.history_limit)
+                self._publish(item)
+        except Exception as err:
+            self.error = err
+        finally:
+            self.done = True
+            self._publish(_END)
+
+    def _publish(self, item: object) -> None:
+        for subscriber in self._subscribers:
+            if subscriber.lagging:
+                continue
+            try:
+                subscriber.queue.put_nowait(item)
+            except asyncio.QueueFull:
+                subscriber.lagging = True
+
+    async def subscribe(self, after: int = 0) -> AsyncIterator[str]:
+        """
+        Items from position ``after`` on, then live ones. Raises
+        ``StreamGap`` if some of them are no longer in the history.
+        """
+        if after < self.offset:
+            raise StreamGap(f"items before {self.offset} were dropped")
+        subscriber = _Subscriber(self.buffer_size)
+        # Snapshot and register without awaiting in between, so no item can
+        # fall between the replay and the live queue.
+        cursor = self.end
+        replay = list(islice(self.history, after - self.offset, None))
+        if not self.done:
+            self._subscribers.add(subscriber)
+        try:
+            for item in replay:
+                yield item
+            while not (self.done and cursor >= self.end):
+                if subscriber.lagging and subscriber.queue.empty():
+                    while cursor < self.end:
+                        if cursor < self.offset:
+                            raise StreamGap(f"items before {self.offset} were dropped")
+                        yield self.history[cursor - self.offset]
+                        cursor += 1
+                    subscriber.lagging = False
+                    continue
+                live = await subscriber.queue.get()
+                if live is _END:
+                    break
+                assert isinstance(live, str)
+                cursor += 1
+                yield live
+            if self.error is not None:
+                raise self.error
+        finally:
+            self._subscribers.discard(subscriber)
+
+
+class SingleFlight:
+    """
+    Shares one in-flight stream between concurrent callers using the same key.
+
+    The shared stream is cancelled as soon as its last caller stops reading,
+    so an abandoned completion does not keep running upstream.
+    """
+
+    def __init__(self, buffer_size: int = 256):
+        self.buffer_size = buffer_size
+        self._inflight: dict[str, StreamBroadcast] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def stream(
+        self, key: str, factory: Callable[[], AsyncIterator[str]]
+    ) -> AsyncIterator[str]:
+        # Joining happens on first iteration, together with subscribing, so
+        # a caller cannot pick up a stream that is being cancelled
+        broadcast = self._inflight.get(key)
+        if broadcast is None or broadcast.done:
+            broadcast = StreamBroadcast(factory(), self.buffer_size)
+            self._inflight[key] = broadcast
+            broadcast.task.add_done_callback(lambda _: self._forget(key, broadcast))
+        try:
+            async for item in broadcast.subscribe():
+                yield item
+        finally:
+            if not broadcast.subscribers and not broadcast.done:
+                self._forget(key, broadcast)
+                broadcast.task.cancel()
+
+    def _forget(self, key: str, broadcast: StreamBroadcast) -> None:
+        if self._inflight.get(key) is broadcast:
+            del self._inflight[key]
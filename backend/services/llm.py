@@ -1,21 +1,232 @@
-from collections.abc import AsyncIterator
+import asyncio
+import importlib.util
+import logging
+import os
+from collections.abc import AsyncGenerator, AsyncIterator
 
+import httpx
 from openai import AsyncOpenAI
+from openai.types import CompletionUsage
 
-from schemas.chat import Prompt
+from core import metrics
+from schemas.chat import LLMResponse, Prompt
+from services.cache import ResponseCache, cache_key
+from services.coalesce import SingleFlight
+from services.tokens import TokenUsage, estimate_tokens
 
-client = AsyncOpenAI()
+MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.7"))
 
+# "off", "exact" (normalized prompt match) or "near" (exact + MinHash
+# near-duplicate match)
+RESPONSE_CACHE_MODE = os.getenv("RESPONSE_CACHE_MODE", "off")
 
-async def generate_stream_response(prompt: Prompt) -> AsyncIterator[str]:
-    stream = await client.chat.completions.create(
-        model="gpt-4o-mini",
+# Concurrent identical prompts share one upstream completion
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "true").lower() == "true"
+
+# Upstream connection pool
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "200"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "50"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "false").lower() == "true"
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+LLM_WRITE_TIMEOUT = float(os.getenv("LLM_WRITE_TIMEOUT", "10"))
+LLM_POOL_TIMEOUT = float(os.getenv("LLM_POOL_TIMEOUT", "10"))
+
+logger = logging.getLogger(__name__)
+
+# Created on first use or by the app lifespan, closed on shutdown
+client: AsyncOpenAI | None = None
+
+response_cache = ResponseCache(
+    max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "300")),
+    near_duplicates=RESPONSE_CACHE_MODE == "near",
+)
+
+inflight = SingleFlight(
+    buffer_size=int(os.getenv("COALESCE_BUFFER_SIZE", "256")),
+)
+
+
+def create_client() -> AsyncOpenAI:
+    http2 = LLM_HTTP2
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("LLM_HTTP2 is set but 'h2' is not installed; using HTTP/1.1")
+        http2 = False
+    http_client = httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            connect=LLM_CONNECT_TIMEOUT,
+            read=LLM_READ_TIMEOUT,
+            write=LLM_WRITE_TIMEOUT,
+            pool=LLM_POOL_TIMEOUT,
+        ),
+    )
+    return AsyncOpenAI(http_client=http_client)
+
+
+def get_client() -> AsyncOpenAI:
+    global client
+    if client is None:
+        client = create_client()
+    return client
+
+
+async def close_client() -> None:
+    global client
+    if client is not None:
+        await client.close()
+        client = None
+
+
+def pool_stats() -> dict[str, int]:
+    """
+    Snapshot of the upstream connection pool.
+
+    ``in_use``/``idle`` count connections, ``active``/``waiting`` count
+    requests (with HTTP/2 one connection carries many active requests).
+    """
+    stats = {"connections": 0, "in_use": 0, "idle": 0, "active": 0, "waiting": 0}
+    if client is None:
+        return stats
+    # httpx/httpcore do not expose pool counters publicly
+    transport = getattr(client._client, "_transport", None)
+    pool = getattr(transport, "_pool", None)
+    if pool is None:
+        return stats
+    connections = list(pool.connections)
+    requests = list(getattr(pool, "_requests", []))
+    stats["connections"] = len(connections)
+    stats["idle"] = sum(1 for conn in connections if conn.is_idle())
+    stats["in_use"] = stats["connections"] - stats["idle"]
+    stats["waiting"] = sum(1 for request in requests if request.is_queued())
+    stats["active"] = len(requests) - stats["waiting"]
+    return stats
+
+
+def format_sse(content: str, event: str | None = None) -> str:
+    if event is not None:
+        return f"event: {event}\ndata: {content}\n\n"
+    return f"data: {content}\n\n"
+
+
+async def stream_deltas(
+    prompt: Prompt, usage: TokenUsage | None = None
+) -> AsyncIterator[str]:
+    """
+    Raw text deltas of the upstream completion. The upstream's token counts
+    are written to ``usage`` when its final usage chunk arrives.
+    """
+    stream = await get_client().chat.completions.create(
+        model=MODEL,
         messages=[{"role": "user", "content": prompt.text}],
-        temperature=0.7,
+        temperature=TEMPERATURE,
         stream=True,
+        stream_options={"include_usage": True},
     )
 
-    async for chunk in stream:
-        delta = chunk.choices[0].delta
-        if delta and delta.content:
-            yield f"data: {delta.content}\n\n"
+    try:
+        async for chunk in stream:
+            if usage is not None and isinstance(chunk.usage, CompletionUsage):
+                usage.set_exact(
+                    chunk.usage.prompt_tokens, chunk.usage.completion_tokens
+                )
+            # The usage chunk has no choices
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta and delta.content:
+                yield delta.content
+    finally:
+        # Stopping early must release the HTTP response now, not on GC
+        await stream.close()
+
+
+async def generate_stream_response(prompt: Prompt) -> AsyncIterator[str]:
+    async for content in stream_deltas(prompt):
+        yield format_sse(content)
+
+
+async def _upstream_deltas(
+    prompt: Prompt, partition: str, key: str, usage: TokenUsage
+) -> AsyncIterator[str]:
+    chunks: list[str] = []
+    try:
+        async for content in stream_deltas(prompt, usage):
+            chunks.append(content)
+            yield content
+    except (asyncio.CancelledError, GeneratorExit):
+        metrics.llm_streams_aborted_total.inc()
+        metrics.llm_aborted_tokens_total.inc(
+            amount=sum(estimate_tokens(content) for content in chunks)
+        )
+        raise
+    # Only completions that finished cleanly are cached
+    if RESPONSE_CACHE_MODE != "off":
+        response_cache.put(partition, key, prompt.text, chunks)
+
+
+async def chat_deltas(
+    prompt: Prompt, usage: TokenUsage | None = None
+) -> AsyncGenerator[str, None]:
+    """
+    Entry point for the chat routes: text deltas for ``prompt``.
+
+    Repeated prompts are replayed from the response cache and concurrent
+    identical prompts share a single upstream completion. ``usage`` is
+    updated as tokens stream; cache replays cost no upstream tokens and
+    are not counted.
+    """
+    if usage is None:
+        usage = TokenUsage()
+    partition, key = cache_key(prompt.text, MODEL, TEMPERATURE, prompt.metadata)
+    if RESPONSE_CACHE_MODE != "off":
+        cached = response_cache.get(partition, key, prompt.text)
+        if cached is not None:
+            for content in cached:
+                yield content
+            return
+
+    usage.prompt_tokens = estimate_tokens(prompt.text)
+    if COALESCE_REQUESTS:
+        # Only the caller that starts the upstream call gets its exact counts
+        deltas = inflight.stream(
+            key, lambda: _upstream_deltas(prompt, partition, key, usage)
+        )
+    else:
+        deltas = _upstream_deltas(prompt, partition, key, usage)
+    async for content in deltas:
+        usage.add_completion(content)
+        yield content
+
+
+async def stream_chat_response(
+    prompt: Prompt, usage: TokenUsage | None = None
+) -> AsyncGenerator[str, None]:
+    """
+    ``chat_deltas`` as one SSE string per delta.
+    """
+    async for content in chat_deltas(prompt, usage):
+        yield format_sse(content)
+
+
+async def complete_chat_response(prompt: Prompt) -> LLMResponse:
+    """
+    The whole completion for ``prompt`` with its token count.
+    """
+    usage = TokenUsage(prompt_tokens=estimate_tokens(prompt.text))
+    parts: list[str] = []
+    async for content in stream_deltas(prompt, usage):
+        usage.add_completion(content)
+        parts.append(content)
+    return LLMResponse(
+        prompt=prompt, response_text="".join(parts), tokens_used=usage.total
+    )
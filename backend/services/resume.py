@@ -0,0 +1,165 @@
+import asyncio
+import os
+import time
+from collections.abc import AsyncIterator, Callable
+
+from services.coalesce import StreamBroadcast
+
+# Set to "false" to stream straight to the client without a replay buffer
+RESUMABLE_STREAMS = os.getenv("RESUMABLE_STREAMS", "true").lower() == "true"
+
+# Finished streams stay resumable for this long (seconds)
+RESUME_TTL = float(os.getenv("RESUME_TTL", "300"))
+# Upstream of a stream nobody is reading is cancelled after this long
+RESUME_GRACE = float(os.getenv("RESUME_GRACE", "30"))
+# Deltas kept per stream, and characters kept across all streams
+RESUME_HISTORY_LIMIT = int(os.getenv("RESUME_HISTORY_LIMIT", "4096"))
+RESUME_MAX_BYTES = int(os.getenv("RESUME_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+class ResumableStream:
+    """
+    One chat stream, produced in the background so a client that drops can
+    reconnect and continue from its last event id.
+    """
+
+    def __init__(
+        self,
+        stream_id: str,
+        owner: str,
+        source: AsyncIterator[str],
+        history_limit: int,
+        grace: float,
+        last_event: Callable[[], str | None] | None = None,
+    ):
+        self.stream_id = stream_id
+        self.owner = owner
+        self.created = time.monotonic()
+        self.finished: float | None = None
+        self.readers = 0
+        self.grace = grace
+        self.broadcast = StreamBroadcast(source, history_limit=history_limit)
+        self.broadcast.task.add_done_callback(self._finish)
+        self._last_event = last_event
+        # Also covers a response that never starts reading
+        self._idle: asyncio.TimerHandle | None = asyncio.get_running_loop().call_later(
+            grace, self.cancel
+        )
+
+    @property
+    def size(self) -> int:
+        return self.broadcast.size
+
+    @property
+    def done(self) -> bool:
+        return self.broadcast.done
+
+    def last_event(self) -> str | None:
+        return self._last_event() if self._last_event is not None else None
+
+    async def subscribe(self, after: int = 0) -> AsyncIterator[str]:
+        """
+        Deltas after position ``after``. When the last reader leaves an
+        unfinished stream, its upstream is cancelled unless someone
+        resumes within ``grace`` seconds.
+        """
+        self.readers += 1
+        if self._idle is not None:
+            self._idle.cancel()
+            self._idle = None
+        try:
+            async for delta in self.broadcast.subscribe(after):
+                yield delta
+        finally:
+            self.readers -= 1
+            if self.readers == 0 and not self.done:
+                self._idle = asyncio.get_running_loop().call_later(
+                    self.grace, self.cancel
+                )
+
+    def cancel(self) -> None:
+        if self.readers == 0:
+            self.broadcast.task.cancel()
+
+    def _finish(self, _: asyncio.Task) -> None:
+        self.finished = time.monotonic()
+        if self._idle is not None:
+            self._idle.cancel()
+            self._idle = None
+
+
+class ResumeBuffers:
+    """
+    Registry of resumable streams in this worker.
+
+    Finished streams expire ``ttl`` seconds after they end. When the
+    buffered text exceeds ``max_bytes`` the oldest finished streams are
+    dropped first, then the oldest live ones stop being resumable.
+    """
+
+    def __init__(
+        self,
+        ttl: float = RESUME_TTL,
+        grace: float = RESUME_GRACE,
+        history_limit: int = RESUME_HISTORY_LIMIT,
+        max_bytes: int = RESUME_MAX_BYTES,
+    ):
+        self.ttl = ttl
+        self.grace = grace
+        self.history_limit = history_limit
+        self.max_bytes = max_bytes
+        self._streams: dict[str, ResumableStream] = {}
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    @property
+    def size(self) -> int:
+        return sum(stream.size for stream in self._streams.values())
+
+    def start(
+        self,
+        stream_id: str,
+        owner: str,
+        source: AsyncIterator[str],
+        last_event: Callable[[], str | None] | None = None,
+    ) -> ResumableStream:
+        self._sweep()
+        stream = ResumableStream(
+            stream_id, owner, source, self.history_limit, self.grace, last_event
+        )
+        self._streams[stream_id] = stream
+        return stream
+
+    def get(self, stream_id: str, owner: str) -> ResumableStream | None:
+        """
+        The stream if it is still buffered and belongs to ``owner``.
+        """
+        self._sweep()
+        stream = self._streams.get(stream_id)
+        if stream is None or stream.owner != owner:
+            return None
+        return stream
+
+    def _sweep(self) -> None:
+        now = time.monotonic()
+        for stream_id, stream in list(self._streams.items()):
+            if stream.finished is not None and now - stream.finished > self.ttl:
+                del self._streams[stream_id]
+        size = self.size
+        if size <= self.max_bytes:
+            return
+        # Oldest first, finished streams before live ones
+        for stream in sorted(
+            self._streams.values(), key=lambda s: (s.finished is None, s.created)
+        ):
+            if size <= self.max_bytes:
+                break
+            size -= stream.size
+            del self._streams[stream.stream_id]
+            if not stream.done:
+                # Keep only what its live reader may still need
+                stream.broadcast.trim(stream.broadcast.buffer_size)
+
+
+resume_buffers = ResumeBuffers()
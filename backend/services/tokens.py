@@ -0,0 +1,54 @@
+import importlib
+import importlib.util
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any
+
+# tiktoken encoding used for local estimates when it is installed
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "o200k_base")
+
+
+@lru_cache(maxsize=1)
+def _encoding() -> Any:
+    if importlib.util.find_spec("tiktoken") is None:
+        return None
+    return importlib.import_module("tiktoken").get_encoding(TOKENIZER_ENCODING)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Local token count for ``text``: exact with tiktoken, otherwise about
+    four characters per token.
+    """
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return max(1, (len(text) + 3) // 4)
+
+
+@dataclass
+class TokenUsage:
+    """
+    Token counts of one completion, estimated locally while it streams and
+    replaced by the upstream's own counts when its usage chunk arrives.
+    """
+
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    exact: bool = False
+
+    @property
+    def total(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add_completion(self, text: str) -> None:
+        if not self.exact:
+            self.completion_tokens += estimate_tokens(text)
+
+    def set_exact(self, prompt_tokens: int, completion_tokens: int) -> None:
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.exact = True
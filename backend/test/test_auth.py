@@ -1,4 +1,16 @@
+import json
+import os
+import sqlite3
+import time
+from unittest.mock import patch
+
 import pytest
+from backend.core.api_keys import (
+    LEGACY_PRINCIPAL,
+    APIKeyRegistry,
+    generate_api_key,
+    hash_api_key,
+)
 from backend.core.security import (
     API_KEY,
     SECRET_KEY,
@@ -6,6 +18,7 @@ from backend.core.security import (
     get_current_user,
     verify_api_key,
 )
+from backend.core.token_cache import VerifiedTokenCache
 from fastapi import HTTPException, status
 from jose import jwt
 
@@ -16,7 +29,7 @@ class TestVerifyAPIKey:
     def test_valid_api_key(self):
         """Test with valid API key."""
         result = verify_api_key(api_key=API_KEY)
-        assert result is None
+        assert result.tenant_id == "default"
 
     def test_invalid_api_key(self):
         """Test with invalid API key."""
@@ -100,3 +113,168 @@ class TestGetCurrentUser:
             get_current_user(token=expired_token)
 
         assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+class TestVerifiedTokenCache:
+    """Test caching of verified JWT claims."""
+
+    def setup_method(self):
+        from backend.core.security import token_cache
+
+        token_cache.clear()
+
+    def test_reused_token_decoded_once(self):
+        """Test second verification of a token skips jwt.decode."""
+        token = create_access_token(data={"sub": "admin"})
+
+        with patch("backend.core.security.jwt.decode", wraps=jwt.decode) as decode:
+            assert get_current_user(token=token) == "admin"
+            assert get_current_user(token=token) == "admin"
+
+        assert decode.call_count == 1
+
+    def test_revoked_token_rejected(self):
+        """Test a revoked token is rejected even when cached."""
+        from backend.core.security import revoke_token
+
+        token = create_access_token(data={"sub": "admin"})
+        get_current_user(token=token)
+        revoke_token(token)
+
+        with pytest.raises(HTTPException) as exc_info:
+            get_current_user(token=token)
+
+        assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_revocation_hook(self):
+        """Test hooks can reject claims of cached tokens."""
+        cache = VerifiedTokenCache()
+        cache.put("token", {"sub": "admin", "exp": time.time() + 60})
+        cache.add_revocation_hook(lambda claims: claims["sub"] == "admin")
+
+        assert cache.get("token") is None
+
+    def test_entry_expires_with_token(self):
+        """Test claims are not served past the token's exp."""
+        cache = VerifiedTokenCache()
+        cache.put("token", {"sub": "admin", "exp": time.time() - 1})
+
+        assert cache.get("token") is None
+        assert cache.misses == 1
+
+    def test_size_bound_evicts_least_recently_used(self):
+        """Test the cache stays within maxsize."""
+        cache = VerifiedTokenCache(maxsize=2)
+        exp = time.time() + 60
+        for token in ("a", "b"):
+            cache.put(token, {"sub": token, "exp": exp})
+        cache.get("a")
+        cache.put("c", {"sub": "c", "exp": exp})
+
+        assert len(cache) == 2
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.hits == 2
+
+
+def write_keys(path, *keys):
+    path.write_text(
+        json.dumps(
+            [
+                {
+                    "key_id": key_id,
+                    "hash": hash_api_key(api_key),
+                    "tenant_id": tenant,
+                    "tier": "pro",
+                    "scopes": ["chat"],
+                }
+                for api_key, key_id, tenant in keys
+            ]
+        )
+    )
+
+
+class TestAPIKeyRegistry:
+    """Test the hashed multi-key API key store."""
+
+    def test_json_source(self, tmp_path):
+        """Test keys loaded from a JSON file resolve to their tenant."""
+        api_key, key_id = generate_api_key()
+        path = tmp_path / "keys.json"
+        write_keys(path, (api_key, key_id, "acme"))
+        registry = APIKeyRegistry(source=str(path))
+
+        principal = registry.authenticate(api_key)
+
+        assert principal is not None
+        assert principal.tenant_id == "acme"
+        assert principal.tier == "pro"
+        assert principal.scopes == frozenset({"chat"})
+        assert principal.key_id == key_id
+
+    def test_wrong_secret_rejected(self, tmp_path):
+        """Test a known key id with the wrong secret is rejected."""
+        api_key, key_id = generate_api_key()
+        path = tmp_path / "keys.json"
+        write_keys(path, (api_key, key_id, "acme"))
+        registry = APIKeyRegistry(source=str(path))
+
+        assert registry.authenticate(f"{key_id}.wrong") is None
+        assert registry.authenticate("unknown.key") is None
+        assert registry.authenticate(None) is None
+
+    def test_sqlite_source(self, tmp_path):
+        """Test keys loaded from a SQLite database."""
+        api_key, key_id = generate_api_key()
+        path = tmp_path / "keys.db"
+        connection = sqlite3.connect(path)
+        connection.execute(
+            "CREATE TABLE api_keys (key_id, hash, tenant_id, tier, scopes)"
+        )
+        connection.execute(
+            "INSERT INTO api_keys VALUES (?, ?, ?, ?, ?)",
+            (key_id, hash_api_key(api_key), "globex", None, "chat admin"),
+        )
+        connection.commit()
+        connection.close()
+        registry = APIKeyRegistry(source=str(path))
+
+        principal = registry.authenticate(api_key)
+
+        assert principal is not None
+        assert principal.tenant_id == "globex"
+        assert principal.tier == "default"
+        assert principal.scopes == frozenset({"chat", "admin"})
+
+    def test_hot_reload(self, tmp_path):
+        """Test a changed key file is picked up without a restart."""
+        old_key, old_id = generate_api_key()
+        new_key, new_id = generate_api_key()
+        path = tmp_path / "keys.json"
+        write_keys(path, (old_key, old_id, "acme"))
+        registry = APIKeyRegistry(source=str(path), reload_interval=0)
+
+        write_keys(path, (new_key, new_id, "acme"))
+        os.utime(path, (time.time() + 10, time.time() + 10))
+
+        assert registry.authenticate(new_key) is not None
+        assert registry.authenticate(old_key) is None
+
+    def test_failed_reload_keeps_keys(self, tmp_path):
+        """Test a broken key file keeps the previously loaded keys."""
+        api_key, key_id = generate_api_key()
+        path = tmp_path / "keys.json"
+        write_keys(path, (api_key, key_id, "acme"))
+        registry = APIKeyRegistry(source=str(path), reload_interval=0)
+
+        path.write_text("[{")
+        os.utime(path, (time.time() + 10, time.time() + 10))
+
+        assert registry.authenticate(api_key) is not None
+
+    def test_legacy_key(self):
+        """Test the single API_KEY env var still authenticates."""
+        registry = APIKeyRegistry(legacy_key="legacy-secret")
+
+        assert registry.authenticate("legacy-secret") == LEGACY_PRINCIPAL
+        assert registry.authenticate("legacy-secreT") is None
@@ -0,0 +1,100 @@
+# tests/test_cache.py
+from unittest.mock import patch
+
+from backend.services.cache import MinHasher, ResponseCache, cache_key, normalize_text
+
+
+class TestCacheKey:
+    """Test prompt normalization and cache keys."""
+
+    def test_normalize_text(self):
+        assert normalize_text("  Hello\n  WORLD  ") == "hello world"
+
+    def test_equivalent_prompts_share_key(self):
+        first = cache_key("What is FastAPI?", "gpt-4o-mini", 0.7, None)
+        second = cache_key("  what is   fastapi? ", "gpt-4o-mini", 0.7, {})
+        assert first == second
+
+    def test_model_temperature_and_metadata_change_key(self):
+        base = cache_key("Hi", "gpt-4o-mini", 0.7, None)
+        assert cache_key("Hi", "gpt-4o", 0.7, None) != base
+        assert cache_key("Hi", "gpt-4o-mini", 0.2, None) != base
+        assert cache_key("Hi", "gpt-4o-mini", 0.7, {"lang": "fr"}) != base
+
+    def test_metadata_order_does_not_matter(self):
+        first = cache_key("Hi", "m", 0.7, {"a": 1, "b": 2})
+        second = cache_key("Hi", "m", 0.7, {"b": 2, "a": 1})
+        assert first == second
+
+
+class TestResponseCache:
+    """Test LRU/TTL/byte budget behaviour."""
+
+    def put(self, cache, text, chunks):
+        partition, key = cache_key(text, "m", 0.7, None)
+        cache.put(partition, key, text, chunks)
+
+    def get(self, cache, text):
+        partition, key = cache_key(text, "m", 0.7, None)
+        return cache.get(partition, key, text)
+
+    def test_hit_and_miss(self):
+        cache = ResponseCache()
+        self.put(cache, "Hello", ["Hi", " there"])
+
+        assert self.get(cache, "hello") == ["Hi", " there"]
+        assert self.get(cache, "Goodbye") is None
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_ttl_expiry(self):
+        cache = ResponseCache(ttl=10)
+        with patch("backend.services.cache.time.monotonic", return_value=100.0):
+            self.put(cache, "Hello", ["Hi"])
+        with patch("backend.services.cache.time.monotonic", return_value=111.0):
+            assert self.get(cache, "Hello") is None
+        assert len(cache) == 0
+
+    def test_byte_budget_evicts_least_recently_used(self):
+        cache = ResponseCache(max_bytes=10)
+        self.put(cache, "a", ["aaaa"])
+        self.put(cache, "b", ["bbbb"])
+        self.get(cache, "a")
+        self.put(cache, "c", ["cccc"])
+
+        assert self.get(cache, "b") is None
+        assert self.get(cache, "a") == ["aaaa"]
+        assert cache.size == 8
+
+    def test_oversized_response_not_cached(self):
+        cache = ResponseCache(max_bytes=4)
+        self.put(cache, "a", ["too long"])
+        assert len(cache) == 0
+
+    def test_near_duplicate_match(self):
+        cache = ResponseCache(near_duplicates=True, similarity_threshold=0.5)
+        self.put(cache, "How do I reset my account password today", ["Click reset"])
+
+        assert self.get(cache, "how do I reset my account password") == ["Click reset"]
+        assert self.get(cache, "What is the weather like in Paris") is None
+
+    def test_near_duplicates_disabled_by_default(self):
+        cache = ResponseCache()
+        self.put(cache, "How do I reset my account password today", ["Click reset"])
+        assert self.get(cache, "how do I reset my account password") is None
+
+
+class TestMinHasher:
+    """Test MinHash similarity estimates."""
+
+    def test_identical_text(self):
+        hasher = MinHasher()
+        signature = hasher.signature("the quick brown fox")
+        assert (
+            hasher.similarity(signature, hasher.signature("The quick  brown fox")) == 1
+        )
+
+    def test_unrelated_text(self):
+        hasher = MinHasher()
+        first = hasher.signature("the quick brown fox jumps")
+        second = hasher.signature("completely different sentence here")
+        assert hasher.similarity(first, second) < 0.2
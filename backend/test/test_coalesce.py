@@ -0,0 +1,107 @@
+# tests/test_coalesce.py
+import asyncio
+
+import pytest
+from backend.services.coalesce import SingleFlight, StreamBroadcast
+
+
+async def gated_source(tokens, gate, calls):
+    calls.append(1)
+    for token in tokens:
+        await gate.wait()
+        yield token
+
+
+async def collect(stream):
+    return [item async for item in stream]
+
+
+class TestSingleFlight:
+    """Test sharing of identical in-flight streams."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_share_one_source(self):
+        flight = SingleFlight()
+        gate = asyncio.Event()
+        calls: list[int] = []
+
+        def factory():
+            return gated_source(["a", "b", "c"], gate, calls)
+
+        tasks = [
+            asyncio.create_task(collect(flight.stream("key", factory)))
+            for _ in range(5)
+        ]
+        await asyncio.sleep(0)
+        gate.set()
+        results = await asyncio.gather(*tasks)
+
+        assert results == [["a", "b", "c"]] * 5
+        assert len(calls) == 1
+        assert len(flight) == 0
+
+    @pytest.mark.asyncio
+    async def test_different_keys_do_not_share(self):
+        flight = SingleFlight()
+        gate = asyncio.Event()
+        calls: list[int] = []
+        gate.set()
+
+        def factory():
+            return gated_source(["x"], gate, calls)
+
+        await asyncio.gather(
+            collect(flight.stream("one", factory)),
+            collect(flight.stream("two", factory)),
+        )
+        assert len(calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_late_joiner_replays_history(self):
+        flight = SingleFlight()
+        feed: asyncio.Queue[str | None] = asyncio.Queue()
+
+        async def manual_source():
+            while (token := await feed.get()) is not None:
+                yield token
+
+        first = flight.stream("key", manual_source)
+        feed.put_nowait("a")
+        assert await anext(first) == "a"
+
+        late = flight.stream("key", manual_source)
+        for token in ("b", "c", None):
+            feed.put_nowait(token)
+
+        assert await collect(first) == ["b", "c"]
+        assert await collect(late) == ["a", "b", "c"]
+
+    @pytest.mark.asyncio
+    async def test_error_reaches_every_subscriber(self):
+        async def failing():
+            yield "a"
+            raise RuntimeError("upstream failed")
+
+        flight = SingleFlight()
+        streams = [flight.stream("key", failing) for _ in range(2)]
+        for stream in streams:
+            with pytest.raises(RuntimeError):
+                await collect(stream)
+
+
+class TestStreamBroadcast:
+    """Test bounded per-subscriber buffering."""
+
+    @pytest.mark.asyncio
+    async def test_slow_subscriber_catches_up_from_history(self):
+        async def source():
+            for i in range(20):
+                yield str(i)
+
+        broadcast = StreamBroadcast(source(), buffer_size=2)
+        slow = broadcast.subscribe()
+        assert await anext(slow) == "0"
+        await broadcast.task
+
+        assert broadcast.done
+        assert await collect(slow) == [str(i) for i in range(1, 20)]
@@ -142,3 +142,11 @@ class TestChatStreamEndpoint:
             },
         )
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_chat_stream_resume_missing_api_key(self, client):
+        """Test resuming a stream without API key."""
+        response = client.get(
+            "/message/stream/abc123",
+            headers={"Last-Event-ID": "5"},
+        )
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
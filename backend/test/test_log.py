@@ -0,0 +1,76 @@
+# tests/test_log.py
+import json
+import logging
+
+from backend.core.log import (
+    ContextFilter,
+    DroppingQueueHandler,
+    JsonFormatter,
+    request_id_var,
+    sampled,
+)
+
+
+def make_record(**extra):
+    record = logging.makeLogRecord(
+        {"name": "test", "levelname": "INFO", "msg": "hello %s", "args": ("world",)}
+    )
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+class TestJsonFormatter:
+    """Test JSON log lines."""
+
+    def test_format_includes_message_and_extra(self):
+        line = JsonFormatter().format(make_record(token="abc"))
+        entry = json.loads(line)
+
+        assert entry["msg"] == "hello world"
+        assert entry["level"] == "INFO"
+        assert entry["token"] == "abc"
+        assert "request_id" not in entry
+
+
+class TestContextFilter:
+    """Test request-scoped ids bound through contextvars."""
+
+    def test_request_id_bound_from_context(self):
+        token = request_id_var.set("req-1")
+        try:
+            record = make_record()
+            ContextFilter().filter(record)
+        finally:
+            request_id_var.reset(token)
+
+        assert record.request_id == "req-1"
+        assert record.trace_id is None
+
+    def test_explicit_trace_id_kept(self):
+        record = make_record(trace_id="explicit")
+        ContextFilter().filter(record)
+        assert record.trace_id == "explicit"
+
+
+class TestDroppingQueueHandler:
+    """Test the handler never blocks when the queue is full."""
+
+    def test_full_queue_drops_record(self):
+        import queue
+
+        handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+        before = DroppingQueueHandler.dropped
+        handler.emit(make_record())
+        handler.emit(make_record())
+
+        assert handler.queue.qsize() == 1
+        assert DroppingQueueHandler.dropped == before + 1
+
+
+class TestSampled:
+    """Test per-token sampling."""
+
+    def test_rate_bounds(self):
+        assert sampled(1.0) is True
+        assert sampled(0.0) is False
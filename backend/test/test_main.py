@@ -11,6 +11,18 @@ class TestMainApp:
         assert "X-Request-Id" in response.headers
         assert len(response.headers["X-Request-Id"]) > 0
 
+    def test_request_ids_are_unique(self, client):
+        """Test each request gets its own request ID."""
+        first = client.get("/public").headers["X-Request-Id"]
+        second = client.get("/public").headers["X-Request-Id"]
+        assert first != second
+
+    def test_request_id_on_error_responses(self, client):
+        """Test the header is added to responses produced by error handlers."""
+        response = client.get("/does-not-exist")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert "X-Request-Id" in response.headers
+
     def test_rate_limit_exception_handler(self, client):
         """Test rate limit exception handler."""
         # This is tested indirectly through rate limiting
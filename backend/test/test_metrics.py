@@ -0,0 +1,93 @@
+# tests/test_metrics.py
+import json
+
+import pytest
+from backend.core.metrics import Counter, Gauge, Histogram, Registry, instrument_stream
+
+
+class TestRegistry:
+    """Test metric types and text exposition."""
+
+    def test_counter_and_gauge(self):
+        registry = Registry()
+        counter = Counter("hits_total", "Hits.", ("route",), registry=registry)
+        gauge = Gauge("open", "Open things.", registry=registry)
+        counter.inc("/a")
+        counter.inc("/a", amount=2)
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+
+        output = registry.render()
+        assert "# TYPE hits_total counter" in output
+        assert 'hits_total{route="/a"} 3' in output
+        assert "open 1" in output
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = Registry()
+        histogram = Histogram(
+            "latency", "Latency.", registry=registry, buckets=(0.1, 1)
+        )
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value)
+
+        output = registry.render()
+        assert 'latency_bucket{le="0.1"} 1' in output
+        assert 'latency_bucket{le="1"} 2' in output
+        assert 'latency_bucket{le="+Inf"} 3' in output
+        assert "latency_count 3" in output
+        assert "latency_sum 5.55" in output
+
+    def test_label_values_escaped(self):
+        registry = Registry()
+        counter = Counter("c", "C.", ("route",), registry=registry)
+        counter.inc('a"b')
+        assert 'c{route="a\\"b"} 1' in registry.render()
+
+    def test_shards_aggregated(self, tmp_path):
+        registry = Registry(str(tmp_path))
+        counter = Counter("hits_total", "Hits.", registry=registry)
+        gauge = Gauge("open", "Open things.", registry=registry)
+        counter.inc(amount=2)
+        gauge.inc()
+
+        # Shard left behind by a worker that has exited
+        dead_shard = {
+            "pid": 2**22 + 1,
+            "metrics": {"hits_total": [[[], 5]], "open": [[[], 7]]},
+        }
+        (tmp_path / "metrics-dead.json").write_text(json.dumps(dead_shard))
+
+        output = registry.render()
+        assert "hits_total 7" in output
+        assert "open 1" in output
+        assert (tmp_path / "metrics-dead.json").exists()
+
+
+class TestInstrumentStream:
+    """Test streaming latency instrumentation."""
+
+    @pytest.mark.asyncio
+    async def test_stream_passes_chunks_through(self):
+        async def source():
+            for chunk in ("a", "b", "c"):
+                yield chunk
+
+        result = [chunk async for chunk in instrument_stream(source(), 0.0)]
+        assert result == ["a", "b", "c"]
+
+
+class TestMetricsEndpoint:
+    """Test /metrics exposition through the app."""
+
+    def test_request_counted_by_route_template(self, client):
+        client.get("/public")
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert (
+            'http_requests_total{method="GET",route="/public",status="200"}'
+            in response.text
+        )
+        assert "http_request_duration_seconds_bucket" in response.text
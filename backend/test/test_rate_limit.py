@@ -0,0 +1,379 @@
+# tests/test_rate_limit.py
+import fnmatch
+import gc
+import json
+import os
+import socketserver
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from backend.core.api_keys import APIKeyRegistry
+from backend.core.rate_limit import rate_limit_key, tier_limit
+from backend.core.rate_limit_policy import RateLimitPolicy, StreamBudget
+from backend.core.rate_limit_storage import RespStorage, SharedMemoryStorage
+from backend.core.security import create_access_token
+from fastapi import HTTPException
+from limits import RateLimitItemPerMinute
+from limits.storage import MemoryStorage
+from limits.strategies import FixedWindowRateLimiter, SlidingWindowCounterRateLimiter
+from starlette.requests import Request
+
+
+class FakeRespServer(socketserver.ThreadingTCPServer):
+    """Tiny in-memory server for the RESP commands RespStorage uses."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeRespHandler)
+        self.data: dict[str, tuple[str, float | None]] = {}
+
+
+class FakeRespHandler(socketserver.StreamRequestHandler):
+    server: FakeRespServer
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2].decode())
+        return args
+
+    def reply(self, value):
+        if value is None:
+            self.wfile.write(b"$-1\r\n")
+        elif isinstance(value, int):
+            self.wfile.write(b":%d\r\n" % value)
+        elif isinstance(value, list):
+            self.wfile.write(b"*%d\r\n" % len(value))
+            for item in value:
+                self.reply(item)
+        elif value == "OK" or value == "PONG":
+            self.wfile.write(f"+{value}\r\n".encode())
+        else:
+            self.wfile.write(b"$%d\r\n%s\r\n" % (len(value), value.encode()))
+
+    def handle(self):
+        data = self.server.data
+        while (args := self.read_command()) is not None:
+            command, *rest = args
+            command = command.upper()
+            now = time.time()
+            for key in [k for k, (_, exp) in data.items() if exp and exp <= now]:
+                del data[key]
+            if command == "PING":
+                self.reply("PONG")
+            elif command == "SET":
+                key, value, *opts = rest
+                if "NX" in opts and key in data:
+                    self.reply(None)
+                    continue
+                expire_at = None
+                if "PX" in opts:
+                    expire_at = now + int(opts[opts.index("PX") + 1]) / 1000
+                data[key] = (value, expire_at)
+                self.reply("OK")
+            elif command == "GET":
+                self.reply(data.get(rest[0], (None, None))[0])
+            elif command in ("INCRBY", "DECRBY"):
+                key, amount = rest[0], int(rest[1])
+                value, expire_at = data.get(key, ("0", None))
+                value = int(value) + (amount if command == "INCRBY" else -amount)
+                data[key] = (str(value), expire_at)
+                self.reply(value)
+            elif command == "PTTL":
+                if rest[0] not in data:
+                    self.reply(-2)
+                else:
+                    expire_at = data[rest[0]][1]
+                    self.reply(
+                        -1 if expire_at is None else int((expire_at - now) * 1000)
+                    )
+            elif command == "PEXPIRE":
+                value, _ = data[rest[0]]
+                data[rest[0]] = (value, now + int(rest[1]) / 1000)
+                self.reply(1)
+            elif command == "DEL":
+                self.reply(sum(data.pop(key, None) is not None for key in rest))
+            elif command == "KEYS":
+                self.reply([key for key in data if fnmatch.fnmatch(key, rest[0])])
+            else:
+                self.wfile.write(b"-ERR unknown command\r\n")
+
+
+@pytest.fixture
+def resp_server():
+    server = FakeRespServer()
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def shm_storage(tmp_path):
+    return SharedMemoryStorage(f"shm://{tmp_path / 'limits.shm'}?slots=64")
+
+
+@pytest.fixture
+def resp_storage(resp_server):
+    host, port = resp_server.server_address
+    return RespStorage(f"resp://{host}:{port}")
+
+
+@pytest.fixture(params=["shm_storage", "resp_storage"])
+def storage(request):
+    return request.getfixturevalue(request.param)
+
+
+class TestSharedStorages:
+    """Behaviour shared by the cross-worker storage backends."""
+
+    def test_incr_and_get(self, storage):
+        assert storage.incr("client", 60) == 1
+        assert storage.incr("client", 60, amount=2) == 3
+        assert storage.get("client") == 3
+        assert storage.get("other") == 0
+        assert storage.get_expiry("client") > time.time()
+
+    def test_clear(self, storage):
+        storage.incr("client", 60)
+        storage.clear("client")
+        assert storage.get("client") == 0
+
+    def test_reset(self, storage):
+        storage.incr("a", 60)
+        storage.incr("b", 60)
+        assert storage.reset() == 2
+        assert storage.get("a") == 0
+
+    def test_check(self, storage):
+        assert storage.check() is True
+
+    def test_fixed_window_limit(self, storage):
+        limiter = FixedWindowRateLimiter(storage)
+        item = RateLimitItemPerMinute(2)
+        assert limiter.hit(item, "client")
+        assert limiter.hit(item, "client")
+        assert not limiter.hit(item, "client")
+
+    def test_sliding_window_limit(self, storage):
+        limiter = SlidingWindowCounterRateLimiter(storage)
+        item = RateLimitItemPerMinute(3)
+        assert [limiter.hit(item, "client") for _ in range(4)] == [
+            True,
+            True,
+            True,
+            False,
+        ]
+        assert limiter.get_window_stats(item, "client").remaining == 0
+        assert limiter.hit(item, "other")
+
+
+class TestSharedMemoryStorage:
+    """Test the mmap-backed single-host storage."""
+
+    def test_counters_shared_between_instances(self, tmp_path):
+        uri = f"shm://{tmp_path / 'limits.shm'}"
+        first, second = SharedMemoryStorage(uri), SharedMemoryStorage(uri)
+        first.incr("client", 60)
+        assert second.incr("client", 60) == 2
+
+    def test_expired_entries_swept(self, tmp_path):
+        storage = SharedMemoryStorage(
+            f"shm://{tmp_path / 'limits.shm'}?slots=4&sweep_interval=0"
+        )
+        for key in "abcd":
+            storage.incr(key, 0)
+        # Every slot holds an expired entry; a new key reclaims them.
+        assert storage.incr("fresh", 60) == 1
+        assert storage.get("fresh") == 1
+
+    def test_full_table_evicts_instead_of_failing(self, tmp_path):
+        storage = SharedMemoryStorage(f"shm://{tmp_path / 'limits.shm'}?slots=2")
+        for key in "abc":
+            assert storage.incr(key, 60) == 1
+
+
+class TestRespStorage:
+    """Test the Redis-protocol storage."""
+
+    def test_keys_are_prefixed(self, resp_server, resp_storage):
+        resp_storage.incr("client", 60)
+        assert list(resp_server.data) == ["rl:client"]
+
+    def test_check_fails_when_server_down(self):
+        storage = RespStorage("resp://127.0.0.1:1?timeout=0.1")
+        assert storage.check() is False
+
+
+def make_request(headers=None):
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/",
+            "headers": [
+                (name.lower().encode(), value.encode())
+                for name, value in (headers or {}).items()
+            ],
+            "client": ("203.0.113.7", 1234),
+        }
+    )
+
+
+class TestRateLimitKey:
+    """Test the principal-based rate limit key."""
+
+    def test_api_key_tenant(self):
+        """Test API key callers share their tenant's bucket."""
+        registry = APIKeyRegistry(legacy_key="tenant-key")
+        with patch("backend.core.rate_limit.api_key_registry", registry):
+            key = rate_limit_key(make_request({"X-API-Key": "tenant-key"}))
+
+        assert key == "default:tenant:default"
+
+    def test_jwt_subject(self):
+        """Test bearer token callers are keyed by subject and tier claim."""
+        token = create_access_token({"sub": "alice", "tier": "pro"})
+
+        key = rate_limit_key(make_request({"Authorization": f"Bearer {token}"}))
+
+        assert key == "pro:user:alice"
+
+    def test_falls_back_to_ip(self):
+        """Test unauthenticated callers are keyed by IP address."""
+        key = rate_limit_key(
+            make_request({"X-API-Key": "wrong", "Authorization": "Bearer bad"})
+        )
+
+        assert key == "anonymous:ip:203.0.113.7"
+
+    def test_tier_limit_provider(self):
+        """Test route limits come from the caller's tier."""
+        policy = RateLimitPolicy()
+        policy.load({"pro": {"limits": {"chat": "100/minute"}}})
+        provider = tier_limit("chat", "5/minute")
+
+        with patch("backend.core.rate_limit.rate_limit_policy", policy):
+            assert provider("pro:tenant:acme") == "100/minute"
+            assert provider("anonymous:ip:1.2.3.4") == "5/minute"
+
+
+class TestRateLimitPolicy:
+    """Test tier configuration loading."""
+
+    def test_unknown_tier_uses_default(self):
+        """Test unknown tiers fall back to the default entry."""
+        policy = RateLimitPolicy()
+        policy.load({"default": {"concurrent_streams": 2}})
+
+        assert policy.tier("anonymous").concurrent_streams == 2
+        assert policy.tier("default").tokens_per_minute is None
+
+    def test_hot_reload(self, tmp_path):
+        """Test an edited tiers file is picked up without a restart."""
+        path = tmp_path / "tiers.json"
+        path.write_text(json.dumps({"pro": {"limits": {"chat": "10/minute"}}}))
+        policy = RateLimitPolicy(source=str(path), reload_interval=0)
+
+        path.write_text(json.dumps({"pro": {"limits": {"chat": "20/minute"}}}))
+        os.utime(path, (time.time() + 10, time.time() + 10))
+
+        assert policy.limit_for("pro", "chat", "5/minute") == "20/minute"
+
+    def test_failed_reload_keeps_tiers(self, tmp_path):
+        """Test a broken tiers file keeps the previous configuration."""
+        path = tmp_path / "tiers.json"
+        path.write_text(json.dumps({"pro": {"limits": {"chat": "10/minute"}}}))
+        policy = RateLimitPolicy(source=str(path), reload_interval=0)
+
+        path.write_text("{")
+        os.utime(path, (time.time() + 10, time.time() + 10))
+
+        assert policy.limit_for("pro", "chat", "5/minute") == "10/minute"
+
+
+async def drain(stream):
+    return [chunk async for chunk in stream]
+
+
+async def chunks(*items):
+    for item in items:
+        yield item
+
+
+class TestStreamBudget:
+    """Test concurrent-stream and token budgets."""
+
+    @pytest.fixture
+    def budget(self):
+        policy = RateLimitPolicy()
+        policy.load({"default": {"concurrent_streams": 1, "tokens_per_minute": 40}})
+        return StreamBudget(policy, FixedWindowRateLimiter(MemoryStorage()))
+
+    def test_concurrent_streams(self, budget):
+        """Test a second stream is rejected until the first ends."""
+        lease = budget.admit("default:tenant:a", "default", "/message/stream")
+
+        with pytest.raises(HTTPException) as exc_info:
+            budget.admit("default:tenant:a", "default", "/message/stream")
+        assert exc_info.value.status_code == 429
+
+        lease.release()
+        budget.admit("default:tenant:a", "default", "/message/stream")
+
+    async def test_tokens_debited(self, budget):
+        """Test streamed tokens are debited from the token budget."""
+        key = "default:tenant:a"
+        lease = budget.admit(key, "default", "/message/stream")
+
+        stream = budget.track(chunks("a", "b"), lambda: 30, lease)
+
+        assert await drain(stream) == ["a", "b"]
+        assert budget.open_streams(key) == 0
+        assert lease.headers()["X-TokenBudget-Remaining"] == "10"
+
+    async def test_stream_cut_when_budget_runs_out(self, budget):
+        """Test the stream is cut and upstream closed when the budget runs out."""
+        key = "default:tenant:a"
+        closed = False
+        used = 0
+
+        async def source():
+            nonlocal closed, used
+            try:
+                for i in range(100):
+                    used += 10
+                    yield str(i)
+            finally:
+                closed = True
+
+        lease = budget.admit(key, "default", "/message/stream")
+        stream = budget.track(source(), lambda: used, lease)
+
+        assert await drain(stream) == ["0", "1", "2", "3", "4", "5"]
+        assert closed
+        assert lease.exhausted
+        with pytest.raises(HTTPException) as exc_info:
+            budget.admit(key, "default", "/message/stream")
+        assert exc_info.value.detail == "Token budget exhausted"
+
+    def test_unstarted_stream_releases_slot(self, budget):
+        """Test a stream dropped before iteration frees its slot."""
+        key = "default:tenant:a"
+        lease = budget.admit(key, "default", "/message/stream")
+        stream = budget.track(chunks("a"), lambda: 0, lease)
+
+        del stream, lease
+        gc.collect()
+
+        assert budget.open_streams(key) == 0
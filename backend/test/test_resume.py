@@ -0,0 +1,111 @@
+# tests/test_resume.py
+import asyncio
+
+import pytest
+from backend.services.coalesce import StreamBroadcast, StreamGap
+from backend.services.resume import ResumeBuffers
+
+
+async def collect(stream):
+    return [item async for item in stream]
+
+
+async def source(tokens, gate=None, closed=None):
+    try:
+        for token in tokens:
+            if gate is not None:
+                await gate.wait()
+            yield token
+    finally:
+        if closed is not None:
+            closed.set()
+
+
+class TestBoundedHistory:
+    """Test the bounded broadcast history."""
+
+    @pytest.mark.asyncio
+    async def test_subscribe_after_position(self):
+        broadcast = StreamBroadcast(source(["a", "b", "c", "d"]))
+        await broadcast.task
+
+        assert await collect(broadcast.subscribe(after=2)) == ["c", "d"]
+
+    @pytest.mark.asyncio
+    async def test_dropped_items_raise_gap(self):
+        broadcast = StreamBroadcast(source(["a", "b", "c", "d"]), history_limit=2)
+        await broadcast.task
+
+        assert broadcast.offset == 2
+        assert await collect(broadcast.subscribe(after=2)) == ["c", "d"]
+        with pytest.raises(StreamGap):
+            await collect(broadcast.subscribe(after=1))
+
+
+class TestResumeBuffers:
+    """Test resumable streams."""
+
+    @pytest.mark.asyncio
+    async def test_resume_after_drop(self):
+        """Test a reconnecting client gets the rest of the stream."""
+        buffers = ResumeBuffers(grace=1)
+        gate = asyncio.Event()
+        stream = buffers.start("s1", "tenant:a", source(["a", "b", "c"], gate))
+        gate.set()
+
+        first = stream.subscribe()
+        assert await anext(first) == "a"
+        await first.aclose()
+
+        resumed = buffers.get("s1", "tenant:a")
+        assert resumed is stream
+        assert await collect(stream.subscribe(after=1)) == ["b", "c"]
+
+    @pytest.mark.asyncio
+    async def test_other_owner_cannot_resume(self):
+        buffers = ResumeBuffers()
+        buffers.start("s1", "tenant:a", source(["a"]))
+
+        assert buffers.get("s1", "tenant:b") is None
+        assert buffers.get("missing", "tenant:a") is None
+
+    @pytest.mark.asyncio
+    async def test_abandoned_stream_cancels_upstream(self):
+        """Test the upstream stops when nobody resumes within the grace."""
+        buffers = ResumeBuffers(grace=0.01)
+        gate = asyncio.Event()
+        closed = asyncio.Event()
+        stream = buffers.start("s1", "tenant:a", source(["a", "b"], gate, closed))
+
+        reader = stream.subscribe()
+        gate.clear()
+        task = asyncio.ensure_future(anext(reader))
+        await asyncio.sleep(0)
+        task.cancel()
+
+        await asyncio.wait_for(closed.wait(), timeout=1)
+        assert stream.done
+
+    @pytest.mark.asyncio
+    async def test_finished_streams_expire(self):
+        buffers = ResumeBuffers(ttl=0)
+        stream = buffers.start("s1", "tenant:a", source(["a"]))
+        await stream.broadcast.task
+        await asyncio.sleep(0.001)
+
+        assert buffers.get("s1", "tenant:a") is None
+        assert len(buffers) == 0
+
+    @pytest.mark.asyncio
+    async def test_memory_cap_evicts_finished_first(self):
+        buffers = ResumeBuffers(max_bytes=5)
+        done = buffers.start("old", "tenant:a", source(["abcd"]))
+        await done.broadcast.task
+        gate = asyncio.Event()
+        buffers.start("live", "tenant:a", source(["xy"], gate))
+        gate.set()
+        await asyncio.sleep(0)
+        buffers.start("new", "tenant:a", source(["z"]))
+
+        assert buffers.get("old", "tenant:a") is None
+        assert buffers.get("live", "tenant:a") is not None
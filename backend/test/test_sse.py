@@ -0,0 +1,108 @@
+# tests/test_sse.py
+import asyncio
+
+import pytest
+from backend.core.sse import SSEEncoder, encode_event
+
+
+async def deltas(*items, delay=0.0):
+    for item in items:
+        if delay:
+            await asyncio.sleep(delay)
+        yield item
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+class TestEncodeEvent:
+    """Test single event encoding."""
+
+    def test_data_only(self):
+        """Test a plain event is one data field."""
+        assert encode_event("Hello") == b"data: Hello\n\n"
+
+    def test_event_and_id(self):
+        """Test event and id fields precede the data."""
+        assert encode_event("x", event="done", event_id="7") == (
+            b"event: done\nid: 7\ndata: x\n\n"
+        )
+
+    def test_multiline_data(self):
+        """Test every line of a multi-line token gets its own data field."""
+        assert encode_event("a\nb\r\nc\rd") == (
+            b"data: a\ndata: b\ndata: c\ndata: d\n\n"
+        )
+
+
+class TestSSEEncoder:
+    """Test delta coalescing and backpressure."""
+
+    async def test_queued_deltas_sent_as_one_event(self):
+        """Test deltas arriving within the window share a write."""
+        encoder = SSEEncoder(flush_interval=0.05)
+
+        chunks = await collect(encoder.encode(deltas("Hel", "lo", " world")))
+
+        assert chunks == [b"id: 3\ndata: Hello world\n\n"]
+
+    async def test_flush_bytes_caps_event_size(self):
+        """Test an event is flushed once it reaches flush_bytes."""
+        encoder = SSEEncoder(flush_interval=0.05, flush_bytes=4)
+
+        chunks = await collect(encoder.encode(deltas("ab", "cd", "ef")))
+
+        assert chunks == [b"id: 2\ndata: abcd\n\n", b"id: 3\ndata: ef\n\n"]
+
+    async def test_slow_deltas_sent_separately(self):
+        """Test deltas further apart than the window are not held back."""
+        encoder = SSEEncoder(flush_interval=0.001)
+
+        chunks = await collect(encoder.encode(deltas("a", "b", delay=0.02)))
+
+        assert chunks == [b"id: 1\ndata: a\n\n", b"id: 2\ndata: b\n\n"]
+
+    async def test_last_event(self):
+        """Test the final named event is appended."""
+        encoder = SSEEncoder(flush_interval=0)
+
+        chunks = await collect(
+            encoder.encode(deltas("a"), last_event=lambda: "budget_exhausted")
+        )
+
+        assert chunks[-1] == b"event: budget_exhausted\ndata: \n\n"
+
+    async def test_error_after_flushing(self):
+        """Test deltas before an upstream error are still sent."""
+        encoder = SSEEncoder(flush_interval=0)
+
+        async def failing():
+            yield "partial"
+            raise RuntimeError("upstream failed")
+
+        stream = encoder.encode(failing())
+
+        assert await anext(stream) == b"id: 1\ndata: partial\n\n"
+        with pytest.raises(RuntimeError):
+            await anext(stream)
+
+    async def test_read_ahead_bounds_upstream(self):
+        """Test a client that stops reading pauses the upstream."""
+        encoder = SSEEncoder(flush_interval=0, flush_bytes=1, read_ahead=4)
+        produced = 0
+
+        async def source():
+            nonlocal produced
+            for i in range(100):
+                produced += 1
+                yield str(i)
+
+        stream = encoder.encode(source())
+        await anext(stream)
+        await asyncio.sleep(0.01)
+
+        # The queue, one delta held back for the next event and one
+        # blocked in put()
+        assert produced < 10
+        await stream.aclose()
@@ -1,10 +1,33 @@
 # tests/test_streaming.py
+import logging
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from backend.core.streaming import stream_tokens
 from backend.schemas.chat import Prompt
-from backend.services.llm import generate_stream_response
+from backend.services import llm
+from backend.services.cache import ResponseCache
+from backend.services.llm import (
+    complete_chat_response,
+    generate_stream_response,
+    stream_chat_response,
+)
+from backend.services.tokens import TokenUsage, estimate_tokens
+from openai.types import CompletionUsage
+
+
+class FakeStream:
+    """Stands in for openai's AsyncStream: async iterable with close()."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __aiter__(self):
+        return self.chunks.__aiter__()
+
+    async def close(self):
+        self.closed = True
 
 
 class TestStreamTokens:
@@ -20,21 +43,30 @@ class TestStreamTokens:
         assert result[1] == "data:  \n\n"
         assert result[2] == "data: World\n\n"
 
-    def test_stream_tokens_with_trace_id(self, capsys):
+    @patch("backend.core.streaming.sampled", return_value=True)
+    def test_stream_tokens_with_trace_id(self, mock_sampled, caplog):
         """Test token streaming with trace ID."""
         tokens = ["Test"]
-        result = list(
-            stream_tokens(
-                tokens,
-                trace_id="123",
+        with caplog.at_level(logging.DEBUG, logger="backend.core.streaming"):
+            result = list(
+                stream_tokens(
+                    tokens,
+                    trace_id="123",
+                )
             )
-        )
 
         assert len(result) == 1
         assert result[0] == "data: Test\n\n"
 
-        captured = capsys.readouterr()
-        assert "[TRACE 123]" in captured.out
+        assert caplog.records[0].trace_id == "123"
+        assert caplog.records[0].token == "Test"
+
+    def test_stream_tokens_trace_not_logged_above_debug(self, caplog):
+        """Test per-token events cost nothing unless DEBUG is enabled."""
+        with caplog.at_level(logging.INFO):
+            list(stream_tokens(["Test"], trace_id="123"))
+
+        assert caplog.records == []
 
     def test_stream_tokens_empty_list(self):
         """Test streaming empty token list."""
@@ -79,7 +111,7 @@ class TestGenerateStreamResponse:
             yield mock_chunk2
 
         mock_client.chat.completions.create = AsyncMock(
-            return_value=mock_stream(),
+            return_value=FakeStream(mock_stream()),
         )
 
         prompt = Prompt(text="Test prompt", talk=1)
@@ -118,7 +150,7 @@ class TestGenerateStreamResponse:
             yield mock_chunk2
 
         mock_client.chat.completions.create = AsyncMock(
-            return_value=mock_stream(),
+            return_value=FakeStream(mock_stream()),
         )
 
         prompt = Prompt(text="Test", talk=1)
@@ -148,7 +180,7 @@ class TestGenerateStreamResponse:
             yield mock_chunk
 
         mock_client.chat.completions.create = AsyncMock(
-            return_value=mock_stream(),
+            return_value=FakeStream(mock_stream()),
         )
 
         prompt = Prompt(text="Test", talk=1)
@@ -177,7 +209,7 @@ class TestGenerateStreamResponse:
             )
 
         mock_client.chat.completions.create = AsyncMock(
-            return_value=mock_stream(),
+            return_value=FakeStream(mock_stream()),
         )
 
         prompt = Prompt(text="User message", talk=1)
@@ -193,3 +225,172 @@ class TestGenerateStreamResponse:
         assert len(call_args.kwargs["messages"]) == 1
         assert call_args.kwargs["messages"][0]["role"] == "user"
         assert call_args.kwargs["messages"][0]["content"] == "User message"
+
+
+class TestCachedStreamResponse:
+    """Test response cache in front of the upstream stream."""
+
+    @pytest.mark.asyncio
+    @patch("backend.services.llm.RESPONSE_CACHE_MODE", "exact")
+    @patch("backend.services.llm.response_cache", new_callable=ResponseCache)
+    @patch("backend.services.llm.client")
+    async def test_repeated_prompt_replayed_from_cache(
+        self,
+        mock_client,
+        mock_cache,
+    ):
+        """Test second identical prompt does not call upstream."""
+
+        async def mock_stream():
+            yield MagicMock(choices=[MagicMock(delta=MagicMock(content="Hi"))])
+            yield MagicMock(choices=[MagicMock(delta=MagicMock(content=" there"))])
+
+        mock_client.chat.completions.create = AsyncMock(
+            side_effect=lambda **_: FakeStream(mock_stream()),
+        )
+
+        first = [c async for c in stream_chat_response(Prompt(text="Hello", talk=1))]
+        second = [c async for c in stream_chat_response(Prompt(text=" hello ", talk=1))]
+
+        assert first == second == ["data: Hi\n\n", "data:  there\n\n"]
+        mock_client.chat.completions.create.assert_called_once()
+
+    @pytest.mark.asyncio
+    @patch("backend.services.llm.RESPONSE_CACHE_MODE", "exact")
+    @patch("backend.services.llm.response_cache", new_callable=ResponseCache)
+    @patch("backend.services.llm.client")
+    async def test_failed_stream_not_cached(
+        self,
+        mock_client,
+        mock_cache,
+    ):
+        """Test an upstream error mid-stream leaves the cache empty."""
+
+        async def mock_stream():
+            yield MagicMock(choices=[MagicMock(delta=MagicMock(content="Hi"))])
+            raise RuntimeError("upstream dropped")
+
+        mock_client.chat.completions.create = AsyncMock(
+            return_value=FakeStream(mock_stream()),
+        )
+
+        with pytest.raises(RuntimeError):
+            async for _ in stream_chat_response(Prompt(text="Hello", talk=1)):
+                pass
+
+        assert len(mock_cache) == 0
+
+
+class TestClientLifecycle:
+    """Test upstream client pool configuration and lifecycle."""
+
+    @pytest.mark.asyncio
+    @patch("backend.services.llm.client", None)
+    async def test_client_created_lazily_and_closed(self):
+        """Test get_client reuses one client until close_client."""
+        from backend.services import llm
+
+        first = llm.get_client()
+        assert llm.get_client() is first
+
+        await llm.close_client()
+        assert llm.client is None
+
+    @pytest.mark.asyncio
+    @patch("backend.services.llm.LLM_MAX_CONNECTIONS", 7)
+    @patch("backend.services.llm.LLM_CONNECT_TIMEOUT", 1.5)
+    async def test_create_client_applies_pool_settings(self):
+        """Test pool limits and timeouts reach the httpx client."""
+        from backend.services.llm import create_client
+
+        client = create_client()
+        try:
+            pool = client._client._transport._pool
+            assert pool._max_connections == 7
+            assert client._client.timeout.connect == 1.5
+        finally:
+            await client.close()
+
+    @patch("backend.services.llm.client", None)
+    def test_pool_stats_without_client(self):
+        """Test pool stats are zero before the client exists."""
+        from backend.services.llm import pool_stats
+
+        assert pool_stats() == {
+            "connections": 0,
+            "in_use": 0,
+            "idle": 0,
+            "active": 0,
+            "waiting": 0,
+        }
+
+    @pytest.mark.asyncio
+    @patch("backend.services.llm.client", None)
+    async def test_pool_stats_with_client(self):
+        """Test pool stats read from a live client."""
+        from backend.services import llm
+
+        llm.get_client()
+        try:
+            assert llm.pool_stats()["connections"] == 0
+        finally:
+            await llm.close_client()
+
+
+class TestTokenUsage:
+    """Test token accounting of streamed completions."""
+
+    def test_estimate_tokens(self):
+        """Test the local estimate without a tokenizer."""
+        assert estimate_tokens("") == 0
+        assert estimate_tokens("Hi") == 1
+        assert estimate_tokens("a" * 40) == 10
+
+    @pytest.mark.asyncio
+    @patch("backend.services.llm.COALESCE_REQUESTS", False)
+    @patch("backend.services.llm.client")
+    async def test_upstream_usage_replaces_estimate(self, mock_client):
+        """Test the upstream usage chunk gives exact counts."""
+
+        async def mock_stream():
+            yield MagicMock(
+                choices=[MagicMock(delta=MagicMock(content="Hello there"))],
+                usage=None,
+            )
+            yield MagicMock(
+                choices=[],
+                usage=CompletionUsage(
+                    prompt_tokens=7, completion_tokens=2, total_tokens=9
+                ),
+            )
+
+        mock_client.chat.completions.create = AsyncMock(
+            return_value=FakeStream(mock_stream())
+        )
+        usage = TokenUsage()
+
+        chunks = [
+            c async for c in stream_chat_response(Prompt(text="Hi", talk=1), usage)
+        ]
+
+        assert chunks == ["data: Hello there\n\n"]
+        assert usage.exact
+        assert usage.total == 9
+        call_args = mock_client.chat.completions.create.call_args
+        assert call_args.kwargs["stream_options"] == {"include_usage": True}
+
+    @pytest.mark.asyncio
+    @patch("backend.services.llm.client")
+    async def test_complete_chat_response_tokens_used(
+        self, mock_client, mock_openai_stream
+    ):
+        """Test tokens_used is filled in from the estimate."""
+        mock_client.chat.completions.create = AsyncMock(
+            return_value=FakeStream(mock_openai_stream)
+        )
+
+        # LLMResponse validates against the Prompt class services.llm imports
+        response = await complete_chat_response(llm.Prompt(text="Hi", talk=1))
+
+        assert response.response_text == "Hello World"
+        assert response.tokens_used == 6